@@ -1,25 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Driver of the HP 3325B synthesizer / function generator
+
+import math
+import re
+import time
+from typing import Iterator, Tuple
+
 import visa
 
+# Functions and their FU parameter
+FUNCTIONS = {'DC': 0, 'sine': 1, 'square': 2, 'triangle': 3, 'positive ramp': 4, 'negative ramp': 5}
+# Sweep modes and their command
+SWEEP_MODES = {'linear': 'LN', 'log': 'LG'}
+
+# Peak to rms ratio of the functions, needed to convert rms and dBm amplitudes
+CREST_FACTORS = {'DC': 1, 'sine': math.sqrt(2), 'square': 1, 'triangle': math.sqrt(3),
+                 'positive ramp': math.sqrt(3), 'negative ramp': math.sqrt(3)}
+# Frequency units of an IFR reply and their factor to Hz
+FREQUENCY_UNITS = {'HZ': 1, 'KH': 1E3, 'MH': 1E6}
+# Amplitude units of an IAM reply: V and mV peak to peak, V and mV rms and dBm into 50 Ohm
+AMPLITUDE_UNITS = ['VO', 'MV', 'VR', 'MR', 'DB']
+
+_VALUE = re.compile(r'([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\s*([A-Z]{2})')
+
+
+class FunctionGenerator(object):
+    """HP 3325B function generator.
+
+    The instrument is connected on the first command and keeps its settings,
+    with reset=True it is reset right away (see rst). Frequency and amplitude
+    are cached, setting the value the generator already has sends nothing."""
+
+    # Limits of the sine output
+    FREQUENCY_MIN = 1E-6
+    FREQUENCY_MAX = 20.999999999E6
+    AMPLITUDE_MIN = 0.001
+    AMPLITUDE_MAX = 10.0
+
+    def __init__(self, GPIBPort: str = 'GPIB::17::INSTR', reset: bool = False):
+        self.GPIBPort = GPIBPort
+        self._inst = None
+        self._frequency = None
+        self._amplitude = None
+        self._function = None
+        if reset:
+            self.rst()
+
+    @property
+    def inst(self):
+        """The visa instrument, it is opened on the first use."""
+        if self._inst is None:
+            rm = visa.ResourceManager('@py')
+            self._inst = rm.open_resource(self.GPIBPort, timeout=None)
+        return self._inst
+
+    def rst(self):
+        """Reset the generator, the cached values are unknown afterwards."""
+        self.inst.write('*RST')
+        self._frequency = None
+        self._amplitude = None
+        self._function = None
+
+    def _interrogate(self, command: str) -> Tuple[float, str]:
+        """Query a value, e.g. IFR for the frequency, and return its number and unit."""
+        reply = self.inst.query(command)
+        match = _VALUE.search(reply)
+        if match is None:
+            raise ValueError('Unexpected reply {!r} to {}!'.format(reply, command))
+        return float(match.group(1)), match.group(2)
+
+    @property
+    def frequency(self) -> float:
+        """Frequency in Hz."""
+        if self._frequency is None:
+            value, unit = self._interrogate('IFR')
+            if unit not in FREQUENCY_UNITS:
+                raise ValueError('Unknown frequency unit {}!'.format(unit))
+            self._frequency = value * FREQUENCY_UNITS[unit]
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, frequency: float):
+        frequency = float(frequency)
+        if not self.FREQUENCY_MIN <= frequency <= self.FREQUENCY_MAX:
+            raise ValueError('Frequency should be between 1 µHz and 20.999999999 MHz!')
+        if frequency != self._frequency:
+            self.inst.write('FR{:.11g}HZ'.format(frequency))
+            self._frequency = frequency
+
+    @property
+    def amplitude(self) -> float:
+        """Amplitude in V peak to peak."""
+        if self._amplitude is None:
+            value, unit = self._interrogate('IAM')
+            if unit not in AMPLITUDE_UNITS:
+                raise ValueError('Unknown amplitude unit {}!'.format(unit))
+            if unit in ('MV', 'MR'):
+                value /= 1000
+            if unit == 'DB':
+                # power in W into 50 Ohm to rms voltage
+                value = math.sqrt(50 * 10 ** (value / 10) / 1000)
+            if unit in ('VR', 'MR', 'DB'):
+                value *= 2 * CREST_FACTORS[self.currentFunction]
+            self._amplitude = value
+        return self._amplitude
+
+    @amplitude.setter
+    def amplitude(self, amplitude: float):
+        amplitude = float(amplitude)
+        if not self.AMPLITUDE_MIN <= amplitude <= self.AMPLITUDE_MAX:
+            raise ValueError('Amplitude should be between 1 mV and 10 V peak to peak!')
+        if amplitude != self._amplitude:
+            self.inst.write('AM{:.4g}VO'.format(amplitude))
+            self._amplitude = amplitude
+
+    def function(self, name: str):
+        """Select the output function, one of FUNCTIONS."""
+        if name not in FUNCTIONS:
+            raise ValueError('Function should be one of {}!'.format(', '.join(sorted(FUNCTIONS))))
+        self.inst.write('FU{}'.format(FUNCTIONS[name]))
+        self._function = name
+        # the amplitude is kept in rms or dBm if it was entered that way
+        self._amplitude = None
+
+    @property
+    def currentFunction(self) -> str:
+        """Name of the selected output function."""
+        if self._function is None:
+            number = int(re.search(r'\d+', self.inst.query('IFU')).group())
+            self._function = {value: name for name, value in FUNCTIONS.items()}[number]
+        return self._function
+
+    def offset(self, offset: float):
+        """DC offset in V."""
+        self.inst.write('OF{:.4g}VO'.format(offset))
+
+    def sweep(self, start: float, stop: float, duration: float, mode: str = 'linear', continuous: bool = False):
+        """Run the internal frequency sweep from start to stop in Hz within duration seconds.
+
+        A single sweep is started unless continuous is set. The frequency is
+        unknown while and after sweeping."""
+        if mode not in SWEEP_MODES:
+            raise ValueError('Sweep mode should be one of {}!'.format(', '.join(sorted(SWEEP_MODES))))
+        for frequency in (start, stop):
+            if not self.FREQUENCY_MIN <= frequency <= self.FREQUENCY_MAX:
+                raise ValueError('Frequency should be between 1 µHz and 20.999999999 MHz!')
+        self.inst.write('ST{:.11g}HZ;SP{:.11g}HZ;TI{:.4g}SE;{};{}'.format(
+            start, stop, duration, SWEEP_MODES[mode], 'SC' if continuous else 'SS'))
+        self._frequency = None
+
+    def step(self, frequencies, dwell: float = 0) -> Iterator[float]:
+        """Step through a frequency list from the host.
 
+        Every step is one write without an answer, the generator yields the
+        frequency dwell seconds after it is set."""
+        for frequency in frequencies:
+            self.frequency = frequency
+            if dwell > 0:
+                time.sleep(dwell)
+            yield self._frequency
 
 
-class function_generator():
-	def __init__(self):
-		print "test"
-		self.frequency = 10000 # in Hz
-		self.FuncGen = visa.instrument("GPIB::17", timeout=None) #Function Generator
-		self.FuncGen.write("*RST")
-		print self.FuncGen.write('FR200KH')
-		print self.FuncGen.write('AM0VO')
-		
-		print self.FuncGen.ask('FR?')
-	def test(self):
-		self.FuncGen = visa.instrument("GPIB::17", timeout=None) #Function Generator
-		print self.FuncGen.ask('FR?')
-		#print self.FuncGen.write('FR10kHz')
-		
-		
-obj = function_generator()
-#obj.test()
-		
-		
+if __name__ == '__main__':
+    generator = FunctionGenerator(reset=True)
+    generator.frequency = 200E3
+    generator.amplitude = 0.001
+    print(generator.frequency)
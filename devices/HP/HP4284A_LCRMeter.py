@@ -10,21 +10,86 @@ __email__ = 'hanefeld@physik.uni-frankfurt.de'
 __status__ = 'alpha'
 __license__ = 'MIT'
 
+import os
 import visa
 import gpib
 import time
 import numpy as np
 
+# Sorted table of all frequencies the device can set, shipped next to this module
+FREQUENCY_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'HP4284A_LCRMeter_frequency_table.npy')
+_frequency_list = None
+
+
+def allowed_frequencies():
+    """ returns the sorted array of all settable frequencies in Hz, the table
+        is loaded on the first call only
+    """
+    global _frequency_list
+    if _frequency_list is None:
+        _frequency_list = np.load(FREQUENCY_TABLE)
+    return _frequency_list
+
+
+def snap_frequencies(frequencies):
+    """ returns the nearest settable frequency for every frequency
+
+        Arguments:
+        frequencies -- (array) frequencies in Hz
+
+        Return:
+        (numpy.array) settable frequencies in Hz
+    """
+    table = allowed_frequencies()
+    frequencies = np.asarray(frequencies, dtype=float)
+    index = np.clip(np.searchsorted(table, frequencies), 1, len(table) - 1)
+    lower = table[index - 1]
+    upper = table[index]
+    return np.where(frequencies - lower <= upper - frequencies, lower, upper)
+
+
+def snap_frequency(frequency):
+    """ returns the nearest settable frequency in Hz to frequency """
+    return float(snap_frequencies(frequency))
+
+
+def log_frequencies(start, stop, points):
+    """ returns a logarithmic sweep of settable frequencies from start to
+        stop in Hz, points which snap to the same frequency are merged
+    """
+    return np.unique(snap_frequencies(np.logspace(np.log10(start), np.log10(stop), points)))
+
 
 class LCR(object):
     """ This class  offers an easy access to the different functionalities
     of the LCR Meter
     """
-    def __init__(self, device):
+
+    # Maximum number of points of a list sweep
+    LIST_SWEEP_POINTS = 10
+    # Parameters which can be swept with a list sweep and their LIST command
+    LIST_SWEEP_PARAMETERS = {'FREQ': 'LIST:FREQ', 'VOLT': 'LIST:VOLT', 'CURR': 'LIST:CURR',
+                             'BIAS:VOLT': 'LIST:BIAS:VOLT', 'BIAS:CURR': 'LIST:BIAS:CURR'}
+    # Maximum number of measurement results in the data buffer memory
+    MEMORY_POINTS = 128
+    # Fields of a result in the data buffer memory: data A, data B, status and bin number
+    MEMORY_FIELDS = 4
+    # Mirrored setting changed by a list sweep of each parameter
+    LIST_SWEEP_STATES = {'FREQ': 'frequency', 'VOLT': 'source_voltage', 'CURR': 'source_voltage',
+                         'BIAS:VOLT': 'dc_bias_voltage', 'BIAS:CURR': 'dc_bias_voltage'}
+    # Settings mirrored by the driver and the query of each, see refresh()
+    STATE_QUERIES = [('measurement_type', 'FUNC:IMP?'), ('frequency', 'FREQ?'), ('source_voltage', 'VOLT?'),
+                     ('aperture', 'APER?'), ('high_power_mode', 'OUTP:HPOW?'), ('dc_bias_status', 'BIAS:STAT?'),
+                     ('dc_bias_voltage', 'BIAS:VOLT?')]
+
+    def __init__(self, device, binary=False):
         """ Initializes the ITC class. It depends on an visa device
 
             Arguments:
             device -- (visa.instrument) a GPIB instrument is required
+            binary -- (bool) transfer measurement data as 64 bit floats
+                      (FORM REAL,64) instead of ASCII
         """
         self.__lcr = device
         self.__lcr.term_chars = '\r'
@@ -36,55 +101,89 @@ class LCR(object):
 
         # Setup the device to work as needed for the following functions
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        self.__lcr.write("FORM ASCII") # Set data output format to ASCii
+        self.binary = binary # Set data output format to ASCii or REAL,64
         self.__lcr.write("TRIG:SOUR BUS") # Set trigger to listen only on gpib-bus
         self.__lcr.write("INIT:CONT ON") # Set the system to continuously wait for the next trigger
 
 
-        # Load a list of allowed frequency vaules for the device
-        self.__frequency_list = np.loadtxt('HP4284A_LCRMeter_frequency_table.par')
-
         # Set a list of all possible meaurement settings
         self.__measurement_ident_list = ['CPD', 'CPQ', 'CPG', 'CPRP', 'CSD', 'CSQ', 'CSRS','LPQ', 'LPD', 'LPG',
                                         'LPRP', 'LSD','LSQ', 'LSRS', 'RX', 'ZTD', 'ZTR', 'GB', 'YTD', 'YTR']
 
-        # Set variables important for the state of the instrument
-        self.high_power_mode = False
-        self.__num_averages = 1 # Has to be preset, because the number averages and the integration time use one LCR-command
-        self.__integration_time = 'MED'
+        # Load the state of the instrument, the getters of the mirrored settings need no communication
+        self.refresh()
+
+
+    def refresh(self):
+        """
+            Loads all mirrored settings (STATE_QUERIES) from the device with
+            one query. Needed only if settings are changed at the front panel.
+        """
+        self.clear() # Clears the GPIB Bus to prevent problems in communication.
+        answers = self.__lcr.ask(';:'.join(query for name, query in self.STATE_QUERIES)).split(';')
+        self.__state = {}
+        for (name, query), answer in zip(self.STATE_QUERIES, answers):
+            self.__state[name] = self.__parse_state(name, answer.strip())
+
+    def __parse_state(self, name, answer):
+        """ converts the answer of a state query into the mirrored value """
+        if name == 'measurement_type':
+            return answer
+        if name == 'aperture':
+            # The integration time and the number of averages use one LCR-command
+            integration_time, num_averages = answer.split(',')
+            return integration_time, int(num_averages)
+        if name in ['high_power_mode', 'dc_bias_status']:
+            return bool(int(answer))
+        return float(answer)
+
+    def __cached(self, name):
+        """ returns a mirrored setting, it is queried if it is unknown """
+        if self.__state[name] is None:
+            self.clear() # Clears the GPIB Bus to prevent problems in communication.
+            query = dict(self.STATE_QUERIES)[name]
+            self.__state[name] = self.__parse_state(name, self.__lcr.ask(query).strip())
+        return self.__state[name]
 
+    @property
+    def binary(self):
+        ''' Method to get if measurement data is transferred in binary form (FORM REAL,64) '''
+        return self.__binary
+
+    @binary.setter
+    def binary(self, value):
+        ''' Set the data transfer format, True for 64 bit floats (FORM REAL,64), False for ASCII '''
+        self.__binary = bool(value)
+        if self.__binary:
+            self.__lcr.write("FORM REAL,64")
+        else:
+            self.__lcr.write("FORM ASCII")
 
     @property
     def frequency(self):
         ''' Method to get the frequency set for the device '''
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        frequency = self.__lcr.ask("FREQ?")
-        return float(frequency)
+        return self.__cached('frequency')
 
     @frequency.setter
     def frequency(self, frequency):
-        ''' Set (Query) the measurement frequency of the device. Non-allowed frequencies are blocked. '''
-        
-        if frequency in self.__frequency_list:
-            value_verified = True
-        else:
-            print "Desired frequency is not an allowed frequency for the device"
-            value_verified = False
+        ''' Set (Query) the measurement frequency of the device. Non-allowed frequencies are set to the nearest allowed frequency. '''
+
+        allowed = snap_frequency(frequency)
+        if allowed != frequency:
+            print("Desired frequency is not an allowed frequency for the device, set to " + repr(allowed) + "Hz.")
 
         # Communication with the instrument
-        if value_verified:
-            signal_str = 'FREQ ' + str(frequency)
-            self.clear() # Clears the GPIB Bus to prevent problems in communication.
-            self.__lcr.write(signal_str)
+        signal_str = 'FREQ ' + repr(allowed)
+        self.clear() # Clears the GPIB Bus to prevent problems in communication.
+        self.__lcr.write(signal_str)
+        self.__state['frequency'] = allowed
 
     
 
     @property
     def measurement_type(self):
         ''' Method to get the measurement type set for the device '''
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        measurement_type = self.__lcr.ask("FUNC:IMP?")
-        return measurement_type
+        return self.__cached('measurement_type')
 
     @measurement_type.setter
     def measurement_type(self, identifier):
@@ -117,8 +216,8 @@ class LCR(object):
         if identifier in self.__measurement_ident_list:
             value_verified = True
         else:
-            print "Measurement identifier is not a valid identifier. Please chose from the following list."
-            print self.__measurement_ident_list
+            print("Measurement identifier is not a valid identifier. Please chose from the following list.")
+            print(self.__measurement_ident_list)
             value_verified = False
 
         # Communication with the instrument
@@ -126,6 +225,7 @@ class LCR(object):
             signal_str = 'FUNC:IMP ' + str(identifier)
             self.clear() # Clears the GPIB Bus to prevent problems in communication.
             self.__lcr.write(signal_str)
+            self.__state['measurement_type'] = identifier
 
 
 
@@ -198,11 +298,7 @@ class LCR(object):
     @property
     def high_power_mode(self):
         ''' Method to get the high power mode setting for the device '''
-
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        high_power_mode = self.__lcr.ask("OUTP:HPOW?")
-        self.__high_power_mode = bool(int(high_power_mode))
-        return self.__high_power_mode
+        return self.__cached('high_power_mode')
 
     @high_power_mode.setter
     def high_power_mode(self, value):
@@ -225,19 +321,16 @@ class LCR(object):
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         if value:
             self.__lcr.write("OUTP:HPOW ON")
-            self.__high_power_mode = True
         else:
             self.__lcr.write("OUTP:HPOW OFF")
-            self.__high_power_mode = False
+        self.__state['high_power_mode'] = value
 
 
 
     @property
     def dc_bias_status(self):
         ''' Method to get the status of a dc bias set for the device '''
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        dc_bias_status = self.__lcr.ask("BIAS:STAT?")
-        return bool(int(dc_bias_status))
+        return self.__cached('dc_bias_status')
 
     @dc_bias_status.setter
     def dc_bias_status(self, value):
@@ -262,15 +355,14 @@ class LCR(object):
             self.__lcr.write("BIAS:STAT ON")
         else:
             self.__lcr.write("BIAS:STAT OFF")
+        self.__state['dc_bias_status'] = value
 
 
 
     @property
     def source_voltage(self):
         ''' Method to get the source oszillator voltage level set for the device '''
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        source_voltage = self.__lcr.ask("VOLT?")
-        return float(source_voltage)
+        return self.__cached('source_voltage')
 
     @source_voltage.setter
     def source_voltage(self, voltage):
@@ -289,19 +381,20 @@ class LCR(object):
             raise ScriptSyntaxError("The voltage must be a float!")
         if voltage < 0.005:
             voltage = 0.005
-            print "Source voltage too low, set to 5mV."
+            print("Source voltage too low, set to 5mV.")
         if self.high_power_mode:
             if voltage > 20.0:
                 voltage = 20.0
-                print "Source voltage too high for HP-Mode, set to 20.0V."
+                print("Source voltage too high for HP-Mode, set to 20.0V.")
         else:
             if voltage > 2.0:
                 voltage = 2.0
-                print "Source voltage too high, set to 2.0V. Switch to high power mode for voltages up to 20.0V."
+                print("Source voltage too high, set to 2.0V. Switch to high power mode for voltages up to 20.0V.")
 
         # Communication with the instrument
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         self.__lcr.write("VOLT " + str(voltage) + "V") 
+        self.__state['source_voltage'] = voltage
 
 
 
@@ -329,28 +422,27 @@ class LCR(object):
             raise ScriptSyntaxError("The current must be a float!")
         if current < 0.05:
             current = 0.05
-            print "Source current too low, set to 0.05mA."
+            print("Source current too low, set to 0.05mA.")
         if self.high_power_mode:
             if current > 200.0:
                 current = 200.0
-                print "Source current too high for HP-Mode, set to 200.0mA."
+                print("Source current too high for HP-Mode, set to 200.0mA.")
         else:
             if current > 20.0:
                 current = 20.0
-                print "Source current too high, set to 20.0mA. Switch to high power mode for currents up to 200.0mA."
+                print("Source current too high, set to 20.0mA. Switch to high power mode for currents up to 200.0mA.")
 
         # Communication with the instrument
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         self.__lcr.write("CURR " + str(current) + "MA") 
+        self.__state['source_voltage'] = None # The oscillator level is set as a current now
 
 
 
     @property
     def dc_bias_voltage(self):
         ''' Method to get the voltage of a dc bias set for the device '''
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        dc_bias_voltage = self.__lcr.ask("BIAS:VOLT?")
-        return float(dc_bias_voltage)
+        return self.__cached('dc_bias_voltage')
 
     @dc_bias_voltage.setter
     def bias_voltage(self, voltage):
@@ -358,7 +450,7 @@ class LCR(object):
             Adjusts the bias voltage set for the device
 
             Arguments:
-            voltage -- (float) bias voltage to be set in volts  (0V-2V/40V)
+            voltage -- (float) bias voltage to be set in volts  (-2V-2V/-40V-40V)
 
         """
 
@@ -367,21 +459,19 @@ class LCR(object):
             voltage = float(voltage)
         except:
             raise ScriptSyntaxError("The voltage must be a float!")
-        if voltage < 0.0:
-            voltage = 0.0
-            print "Bias voltage too low, set to 0V."
         if self.high_power_mode:
-            if voltage > 40.0:
-                voltage = 40.0
-                print "Bias voltage too high for HP-Mode, set to 40.0V."
+            if abs(voltage) > 40.0:
+                voltage = 40.0 if voltage > 0 else -40.0
+                print("Bias voltage out of range for HP-Mode, set to " + str(voltage) + "V.")
         else:
-            if voltage > 2.0:
-                voltage = 2.0
-                print "Bias voltage too high, set to 2.0V. Switch to high power mode for voltages up to 40.0V."
+            if abs(voltage) > 2.0:
+                voltage = 2.0 if voltage > 0 else -2.0
+                print("Bias voltage out of range, set to " + str(voltage) + "V. Switch to high power mode for voltages up to +-40.0V.")
 
         # Communication with the instrument
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         self.__lcr.write("BIAS:VOLT " + str(voltage) + "V")  
+        self.__state['dc_bias_voltage'] = voltage
 
 
 
@@ -409,27 +499,25 @@ class LCR(object):
             raise ScriptSyntaxError("The current must be a float!")
         if current < 0.0:
             current = 0.0
-            print "Bias current too low, set to 0mA."
+            print("Bias current too low, set to 0mA.")
         if self.high_power_mode:
             if current > 100.0:
                 current = 100.0
-                print "Bias current too high for HP-Mode, set to 100.0mA."
+                print("Bias current too high for HP-Mode, set to 100.0mA.")
         else:
-            print "Bias current not available for normal mode, use high-power mode instead."
+            print("Bias current not available for normal mode, use high-power mode instead.")
 
         # Communication with the instrument
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         self.__lcr.write("BIAS:CURR " + str(current) + "MA")
+        self.__state['dc_bias_voltage'] = None # The bias is set as a current now
 
 
 
     @property
     def integration_time(self):
         ''' Method to get integration time set for the device '''
-
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        integration_time = self.__lcr.ask("APER?")
-        return integration_time.split(',')[0]
+        return self.__cached('aperture')[0]
 
     @integration_time.setter
     def integration_time(self, identifier):
@@ -445,24 +533,23 @@ class LCR(object):
         if identifier in ['SHOR', 'MED', 'LONG']:
             value_verified = True
         else:
-            print "Identifier is not a valid identifier. Please chose from 'SHOR', 'MED' and 'LONG'."
+            print("Identifier is not a valid identifier. Please chose from 'SHOR', 'MED' and 'LONG'.")
             value_verified = False
 
         # Communication with the instrument
         if value_verified:
-            signal_str = 'APER ' + str(identifier) + ',' + str(self.__num_averages)
+            num_averages = self.__cached('aperture')[1]
+            signal_str = 'APER ' + str(identifier) + ',' + str(num_averages)
             self.clear() # Clears the GPIB Bus to prevent problems in communication.
             self.__lcr.write(signal_str)
+            self.__state['aperture'] = (identifier, num_averages)
 
 
 
     @property
     def num_averages(self):
         ''' Method to get the number measurements that should be averaged for one data point set for the device '''
-
-        self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        num_averages = self.__lcr.ask("APER?")
-        return float(num_averages.split(',')[1])
+        return self.__cached('aperture')[1]
 
     @num_averages.setter
     def num_averages(self, value):
@@ -478,25 +565,283 @@ class LCR(object):
             raise ScriptSyntaxError("The valuee must be an integer!")
         if value < 1:
             value = 1
-            print "Number of averages to low, set to 1."
+            print("Number of averages to low, set to 1.")
         if value > 128:
             value = 128
-            print "Number of averages to high, set to 128."
+            print("Number of averages to high, set to 128.")
 
         # Communication with the instrument
-        signal_str = 'APER ' + str(self.integration_time) + ',' + str(value)
+        integration_time = self.__cached('aperture')[0]
+        signal_str = 'APER ' + str(integration_time) + ',' + str(value)
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
         self.__lcr.write(signal_str)
+        self.__state['aperture'] = (integration_time, value)
 
     def read_data(self):
         ''' 
         Method to get the measuement data from the device. The *TRG command (trigger command) performs the same function as the Group Execute Trigger. This command moves the primary and secondary parameter measurement data into the HP 4284A's output buffer. '''
 
         self.clear() # Clears the GPIB Bus to prevent problems in communication.
-        data = self.__lcr.ask("*TRG")
-        value1 = float(data.split(',')[0])
-        value2 = float(data.split(',')[1])
-        return float(value1), float(value2)
+        record = self.__ask_records("*TRG", 1)[0]
+        return float(record[0]), float(record[1])
+
+    def snap_frequency(self, frequency):
+        """ returns the nearest frequency in Hz the device can set """
+        return snap_frequency(frequency)
+
+    def snap_frequencies(self, frequencies):
+        """ returns the nearest frequencies in Hz the device can set """
+        return snap_frequencies(frequencies)
+
+    def list_sweep(self, parameter, values):
+        """
+            Measures at several points with the internal list sweep of the
+            device. One trigger runs the whole list, lists longer than
+            LIST_SWEEP_POINTS are split into segments.
+
+            Arguments:
+            parameter -- (string) swept parameter, one of 'FREQ' (Hz),
+                         'VOLT' (V), 'CURR' (A), 'BIAS:VOLT' (V) or
+                         'BIAS:CURR' (A)
+            values -- (list) sweep points
+
+            Return:
+            primary -- (numpy.array) primary parameter of every point
+            secondary -- (numpy.array) secondary parameter of every point
+            status -- (numpy.array) measurement status of every point
+        """
+        if parameter not in self.LIST_SWEEP_PARAMETERS:
+            raise ValueError("Parameter must be one of " + str(sorted(self.LIST_SWEEP_PARAMETERS)))
+
+        self.clear() # Clears the GPIB Bus to prevent problems in communication.
+        records = np.concatenate([segment for start, segment in self.__list_segments(parameter, values)])
+        return records[:, 0], records[:, 1], records[:, 2]
+
+    def __list_segments(self, parameter, values):
+        """
+            Runs a list sweep without clearing the bus and yields the index of
+            the first point and the records of every segment as it arrives.
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        self.__lcr.write("DISP:PAGE LIST") # The list sweep runs only on the list sweep page
+        self.__lcr.write("LIST:MODE SEQ") # One trigger sweeps all points
+
+        try:
+            for start in range(0, len(values), self.LIST_SWEEP_POINTS):
+                segment = values[start:start + self.LIST_SWEEP_POINTS]
+                self.__lcr.write(self.LIST_SWEEP_PARAMETERS[parameter] + ' ' +
+                                 ','.join(repr(float(value)) for value in segment))
+                yield start, self.__ask_records("*TRG", len(segment))
+        finally:
+            self.__lcr.write("DISP:PAGE MEAS")
+            # The device may keep a setting of the list, it is queried again when needed
+            self.__state[self.LIST_SWEEP_STATES[parameter]] = None
+
+    def buffered_measurement(self, points, trigger='BUS', measurement_time=None, timeout=10.0):
+        """
+            Measures several times without reading the single results. The
+            results are stored in the data buffer memory of the device and
+            read in one transfer per MEMORY_POINTS results.
+
+            Arguments:
+            points -- (int) number of measurements
+            trigger -- (string) 'BUS' sends the bus triggers of a buffer
+                       in one message, each followed by *WAI so no trigger
+                       hits a running measurement, 'INT' lets the device
+                       measure continuously with its internal trigger
+            measurement_time -- (float) time in seconds of one measurement,
+                                needed for the internal trigger to know when
+                                the buffer is filled
+            timeout -- (float) time in seconds to wait for missing results
+                       after the buffer should be filled
+
+            Return:
+            primary -- (numpy.array) primary parameter of every measurement
+            secondary -- (numpy.array) secondary parameter of every measurement
+            status -- (numpy.array) measurement status of every measurement
+        """
+        if trigger not in ['BUS', 'INT']:
+            raise ValueError("Trigger must be 'BUS' or 'INT'.")
+        if trigger == 'INT' and measurement_time is None:
+            raise ValueError("The internal trigger needs the measurement time.")
+        points = int(points)
+
+        self.clear() # Clears the GPIB Bus to prevent problems in communication.
+        records = []
+        for start in range(0, points, self.MEMORY_POINTS):
+            count = min(points - start, self.MEMORY_POINTS)
+            self.__lcr.write("MEM:DIM DBUF," + str(count)) # Size the buffer, this also clears it
+            self.__lcr.write("MEM:FILL DBUF") # Store every following result in the buffer
+
+            if trigger == 'BUS':
+                # A trigger during a running measurement is ignored, *WAI holds the next one back
+                self.__lcr.write(";".join([":TRIG:IMM;*WAI"] * count))
+                self.__lcr.ask("*OPC?")
+            else:
+                self.__lcr.write("TRIG:SOUR INT")
+                time.sleep(count * measurement_time) # Results after a full buffer are not stored
+
+            # Poll the buffer until it holds all results
+            deadline = time.time() + timeout
+            stored = self.__read_memory()
+            while len(stored) < count and time.time() < deadline:
+                time.sleep(measurement_time or 0.1)
+                stored = self.__read_memory()
+            if trigger == 'INT':
+                self.__lcr.write("TRIG:SOUR BUS")
+            self.__lcr.write("MEM:CLE DBUF") # Stop storing results and free the buffer
+
+            if len(stored) < count:
+                raise RuntimeError("The data buffer holds only " + str(len(stored)) + " of " +
+                                   str(count) + " results.")
+            records.append(stored[:count])
+
+        records = np.concatenate(records)
+        return records[:, 0], records[:, 1], records[:, 2]
+
+    def bias_sweep(self, voltages, dwell=0, hysteresis=False, filename=None):
+        """
+            Measures a C-V curve by stepping the DC bias voltage. Without a
+            dwell time the points are measured with list sweeps, otherwise
+            every point is set, waited for and triggered on its own. The
+            results of a point are written to the file while the device
+            waits for the next one. The bus is cleared once per sweep and the
+            DC bias is restored afterwards.
+
+            Arguments:
+            voltages -- (list) bias voltages in volts, negative voltages
+                        reverse the bias
+            dwell -- (float) time in seconds to wait after a bias step
+            hysteresis -- (bool) sweep back from the last to the first voltage
+            filename -- (string) tab separated text file the results are
+                        written to as they arrive
+
+            Return:
+            (numpy.array) structured array with the fields V, primary,
+            secondary and status
+        """
+        voltages = np.atleast_1d(np.asarray(voltages, dtype=float))
+        if hysteresis:
+            voltages = np.concatenate((voltages, voltages[-2::-1]))
+        limit = 40.0 if self.high_power_mode else 2.0
+        if np.abs(voltages).max() > limit:
+            raise ValueError("Bias voltages must be between -" + str(limit) + "V and " + str(limit) + "V.")
+
+        results = np.zeros(len(voltages), dtype=[('V', float), ('primary', float),
+                                                 ('secondary', float), ('status', int)])
+        results['V'] = voltages
+        output = None
+        if filename is not None:
+            output = open(filename, 'w')
+            output.write('V\tprimary\tsecondary\tstatus\n')
+
+        # The bias is restored after the sweep
+        bias_status = self.dc_bias_status
+        bias_voltage = self.dc_bias_voltage
+
+        self.clear() # Clears the GPIB Bus once, the steps need no further clears
+        try:
+            if not bias_status:
+                self.__lcr.write("BIAS:STAT ON")
+                self.__state['dc_bias_status'] = True
+
+            if dwell <= 0:
+                for start, records in self.__list_segments('BIAS:VOLT', voltages):
+                    stop = start + len(records)
+                    results['primary'][start:stop] = records[:, 0]
+                    results['secondary'][start:stop] = records[:, 1]
+                    results['status'][start:stop] = records[:, 2]
+                    self.__write_results(output, results[start:stop])
+            else:
+                for index, voltage in enumerate(voltages):
+                    voltage = float(voltage)
+                    self.__lcr.write("BIAS:VOLT " + repr(voltage) + "V")
+                    self.__state['dc_bias_voltage'] = voltage
+                    ready = time.time() + dwell
+                    # Write the previous point while the bias settles
+                    if index > 0:
+                        self.__write_results(output, results[index - 1:index])
+                    time.sleep(max(ready - time.time(), 0))
+
+                    record = self.__ask_records("*TRG", 1)[0]
+                    results[index] = (voltage, record[0], record[1], record[2])
+                self.__write_results(output, results[-1:])
+        finally:
+            if output is not None:
+                output.close()
+            self.__lcr.write("BIAS:VOLT " + repr(float(bias_voltage)) + "V")
+            self.__state['dc_bias_voltage'] = bias_voltage
+            if not bias_status:
+                self.__lcr.write("BIAS:STAT OFF")
+                self.__state['dc_bias_status'] = False
+
+        return results
+
+    def __write_results(self, output, results):
+        """ writes rows of a bias sweep to the output file, if there is one """
+        if output is None:
+            return
+        for row in results:
+            output.write('%r\t%r\t%r\t%d\n' % (float(row['V']), float(row['primary']),
+                                                float(row['secondary']), int(row['status'])))
+        output.flush()
+
+    def __ask_records(self, command, points):
+        """
+            Sends a command and returns its measurement records with one row
+            per measurement point. A row holds data A, data B, the status and,
+            if the comparator is on, the bin number.
+
+            Arguments:
+            command -- (string) command which returns measurement data
+            points -- (int) number of measurement points in the answer
+
+            Return:
+            (numpy.array) float64 array of the shape (points, fields)
+        """
+        values = self.__ask_values(command)
+        return values.reshape(points, len(values) // points)
+
+    def __read_memory(self):
+        """ returns the results stored in the data buffer memory with one row per result """
+        values = self.__ask_values("MEM:READ? DBUF")
+        return values[:len(values) - len(values) % self.MEMORY_FIELDS].reshape(-1, self.MEMORY_FIELDS)
+
+    def __ask_values(self, command):
+        """ sends a command and returns all values of its answer as a float64 array """
+        if self.__binary:
+            self.__lcr.write(command)
+            return self.__read_block()
+        answer = self.__lcr.ask(command).strip()
+        if not answer:
+            return np.empty(0)
+        return np.array(answer.split(','), dtype=float)
+
+    def __read_block(self):
+        """
+            Reads an IEEE 488.2 block of 64 bit floats (FORM REAL,64). The
+            end of string detection is switched off during the read, because
+            the binary data can contain the termination character.
+
+            Return:
+            (numpy.array) float64 values of the block
+        """
+        gpib.config(self.__lcr.device, gpib.IbcEOSrd, 0)
+        try:
+            data = self.__lcr.read_raw()
+        finally:
+            gpib.config(self.__lcr.device, gpib.IbcEOSrd, 0x800 | 0x400)
+
+        start = data.index(b'#')
+        digits = int(data[start + 1:start + 2])
+        if digits == 0:
+            # Indefinite length block, it ends with the message terminator
+            body = data[start + 2:]
+            body = body[:len(body) - len(body) % 8]
+        else:
+            length = int(data[start + 2:start + 2 + digits])
+            body = data[start + 2 + digits:start + 2 + digits + length]
+        return np.frombuffer(body, dtype='>f8').astype(np.float64)
 
     def clear(self):
         """
@@ -519,11 +864,11 @@ if __name__ == '__main__':
     DEVICE = visa.instrument('GPIB::4', timeout = None)
     lcr = LCR(DEVICE)
 
-    print lcr.frequency
+    print(lcr.frequency)
     lcr.frequency = 1000
-    print lcr.frequency
+    print(lcr.frequency)
     lcr.measurement_type = 'ZTD'
     lcr.num_averages = 5
-    print lcr.read_data()
+    print(lcr.read_data())
     lcr.save()
     
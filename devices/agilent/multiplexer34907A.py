@@ -1,19 +1,86 @@
+def channel_list(channels) -> str:
+    """Compress channels into a SCPI channel list, e.g. (@101:110,115).
+
+    Channels below 100 are routes on the card in slot 1."""
+    numbers = _channels(channels)
+    parts = []
+    start = 0
+    while start < len(numbers):
+        stop = start
+        while stop + 1 < len(numbers) and numbers[stop + 1] == numbers[stop] + 1:
+            stop += 1
+        if stop - start >= 2:
+            parts.append("{}:{}".format(numbers[start], numbers[stop]))
+        else:
+            parts.extend(str(number) for number in numbers[start:stop + 1])
+        start = stop + 1
+    return "(@{})".format(",".join(parts))
+
+
+def _channels(channels) -> list:
+    """Sorted channel numbers of a route, a list of routes or a range."""
+    if isinstance(channels, int):
+        channels = [channels]
+    return sorted({channel + 100 if channel < 100 else channel for channel in channels})
+
+
 class Multiplexer34970A(object):
-    """With add-in card Agilent 34901A on channel 1."""
-    
+    """With add-in card Agilent 34901A on channel 1.
+
+    The relay states are cached, switching a relay which is already in the
+    desired state sends no command."""
+
     def __init__(self, device):
         self.dev = device
         self.dev.write_termination = "\n"
         self.dev.read_termination = "\n"
         self.dev.write('*RST')
+        # All relays are open after a reset
+        self._closed = set()
+        # Channels switched by a scan, their state is not known
+        self._unknown = set()
+        self._scan = []
+
+    @property
+    def closed(self) -> list:
+        """Channels closed by this driver."""
+        return sorted(self._closed)
 
-    def open(self, route: int):
-       """Open the relay on a route."""
-       self.dev.write(":ROUTE:OPEN (@1{:02d})".format(route))
-       
-    def close(self, route: int):
-       """Close the relay on a route."""
-       self.dev.write(":ROUTE:CLOSE (@1{:02d})".format(route))
+    def open(self, routes):
+        """Open the relays on a route, a list of routes or a range."""
+        self._switch(routes, False)
+
+    def close(self, routes):
+        """Close the relays on a route, a list of routes or a range."""
+        self._switch(routes, True)
+
+    def _switch(self, routes, close: bool):
+        """Switch all relays which are not in the desired state with one command."""
+        channels = [channel for channel in _channels(routes)
+                    if channel in self._unknown or (channel in self._closed) != close]
+        if not channels:
+            return
+        self.dev.write(":ROUTE:{} {}".format("CLOSE" if close else "OPEN", channel_list(channels)))
+        if close:
+            self._closed.update(channels)
+        else:
+            self._closed.difference_update(channels)
+        self._unknown.difference_update(channels)
+
+    def scan(self, routes):
+        """Set the scan list, the channels are measured one after the other by initiate()."""
+        self._scan = _channels(routes)
+        self.dev.write(":ROUTE:SCAN {}".format(channel_list(self._scan)))
+
+    def initiate(self):
+        """Run the scan list.
+
+        A scan opens the channels of the scanned cards, not only those in the
+        scan list, all of them are unknown until they are switched again."""
+        self.dev.write(":INITIATE")
+        cards = {channel // 100 for channel in self._scan}
+        self._unknown.update(self._scan)
+        self._unknown.update(channel for channel in self._closed if channel // 100 in cards)
 
 
 if __name__=='__main__':
@@ -25,10 +92,12 @@ if __name__=='__main__':
     dev = rm.open_resource('GPIB::03::INSTR')
 
     mux = Multiplexer34970A(dev)
-    
+
     for i in range(5):
         mux.open(12)
         sleep(1)
         mux.close(12)
         sleep(1)
-    
+
+    mux.close(range(1, 11))
+    mux.open([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 15])
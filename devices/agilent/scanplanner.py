@@ -0,0 +1,129 @@
+"""Scan planner for impedance measurements through the switch unit.
+
+The points of a scan are measured with a Multiplexer34970A routing the
+samples to an HP4284A LCR meter. Switching relays and changing the frequency
+or the oscillator level are the slow operations, the planner orders the
+points so that each of them changes as rarely as possible and measures all
+frequencies of a channel and level with the list sweep of the LCR meter."""
+
+import time
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+ScanPoint = namedtuple('ScanPoint', 'channel frequency level')
+
+
+class ScanPlanner(object):
+    """Orders scan points and measures them with a switch unit and an LCR meter.
+
+    The times in seconds of the cost model are estimates of the single
+    operations, they are used to compare the plan with the naive order."""
+
+    def __init__(self, switch_time: float = 0.05, frequency_time: float = 0.2, level_time: float = 0.2,
+                 trigger_time: float = 0.3, point_time: float = 0.1, list_points: int = 10):
+        self.switch_time = switch_time
+        self.frequency_time = frequency_time
+        self.level_time = level_time
+        # Round trip of a triggered read, once per point or once per list sweep
+        self.trigger_time = trigger_time
+        self.point_time = point_time
+        # Number of points of one list sweep of the LCR meter
+        self.list_points = list_points
+
+    def plan(self, points) -> list:
+        """Group the points by channel and level, one group per list sweep.
+
+        The groups are nested channel first and level first, the cheaper of
+        both orders by plan_cost is returned. Every other outer group runs
+        through its inner groups downwards and every other group through its
+        frequencies (serpentine), so a group mostly starts with the channel or
+        level and the frequency the last one ended with.
+
+        Returns a list of (channel, level, frequencies) groups."""
+        points = sorted(set(ScanPoint(*point) for point in points))
+        plans = [_serpentine(points, outer_channel=True), _serpentine(points, outer_channel=False)]
+        return min(plans, key=self.plan_cost)
+
+    def cost(self, points) -> float:
+        """Estimated time of measuring the points one by one in the given order."""
+        total = 0.0
+        previous = ScanPoint(None, None, None)
+        for point in (ScanPoint(*point) for point in points):
+            total += self.switch_time * (point.channel != previous.channel)
+            total += self.level_time * (point.level != previous.level)
+            total += self.frequency_time * (point.frequency != previous.frequency)
+            total += self.trigger_time + self.point_time
+            previous = point
+        return total
+
+    def plan_cost(self, plan) -> float:
+        """Estimated time of a plan, one list sweep per group."""
+        total = 0.0
+        previous = (None, None, None)
+        for channel, level, frequencies in plan:
+            total += self.switch_time * (channel != previous[0])
+            total += self.level_time * (level != previous[1])
+            # The first frequency is free if the previous group ended with it
+            changes = len(frequencies) - (previous[2] is not None and frequencies[0] == previous[2][-1])
+            total += self.frequency_time * changes + self.point_time * len(frequencies)
+            total += self.trigger_time * -(-len(frequencies) // self.list_points)
+            previous = (channel, level, frequencies)
+        return total
+
+    def run(self, mux, lcr, points):
+        """Measure the points in the planned order.
+
+        mux needs open, close and closed like Multiplexer34970A, lcr needs
+        source_voltage and list_sweep like the HP4284A LCR class.
+
+        Returns a structured array with the fields channel, frequency, level,
+        primary, secondary and status in the order of points and a report
+        dict with the estimated naive and planned times, the estimated time
+        saved and the measured time."""
+        points = [ScanPoint(*point) for point in points]
+        plan = self.plan(points)
+        report = {'naive': self.cost(points), 'planned': self.plan_cost(plan)}
+        report['saved'] = report['naive'] - report['planned']
+
+        measured = {}
+        start = time.time()
+        for channel, level, frequencies in plan:
+            others = [closed for closed in mux.closed if closed != _route(channel)]
+            if others:
+                mux.open(others)
+            mux.close(channel)
+            if lcr.source_voltage != level:
+                lcr.source_voltage = level
+            primary, secondary, status = lcr.list_sweep('FREQ', frequencies)
+            for index, frequency in enumerate(frequencies):
+                measured[ScanPoint(channel, frequency, level)] = (primary[index], secondary[index], status[index])
+        report['measured'] = time.time() - start
+
+        results = np.zeros(len(points), dtype=[('channel', int), ('frequency', float), ('level', float),
+                                               ('primary', float), ('secondary', float), ('status', int)])
+        for index, point in enumerate(points):
+            results[index] = point + measured[point]
+        return results, report
+
+
+def _serpentine(points, outer_channel: bool) -> list:
+    """Serpentine order of sorted points grouped by channel and level, with
+    the channel or the level as outer loop."""
+    outer = OrderedDict()
+    for channel, frequency, level in points:
+        key, inner = (channel, level) if outer_channel else (level, channel)
+        outer.setdefault(key, OrderedDict()).setdefault(inner, []).append(frequency)
+
+    plan = []
+    for index, (key, groups) in enumerate(outer.items()):
+        for inner in (list(groups) if index % 2 == 0 else list(reversed(groups))):
+            frequencies = groups[inner]
+            channel, level = (key, inner) if outer_channel else (inner, key)
+            plan.append((channel, level, frequencies if len(plan) % 2 == 0 else frequencies[::-1]))
+    return plan
+
+
+def _route(channel: int) -> int:
+    """Channel number of a route, routes below 100 are on the card in slot 1."""
+    return channel + 100 if channel < 100 else channel
@@ -18,24 +18,146 @@ except ImportError as import_error:
     import sys
     sys.exit()
 
-from threading import Lock
-import sys
+from threading import Lock, Thread, Event
+from collections import namedtuple, OrderedDict
 from datetime import datetime
 import time
 
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+
+class CommunicationErrorLog(object):
+    """ Collects communication errors of the Mini8 and appends them to a log
+        file from a background thread, so a failing request never waits for
+        file I/O. Error counts and rates are kept per source, e.g. per Loop.
+        Controllers on one line share a log, the sources start with the slave
+        address.
+    """
+    def __init__(self, filename='temperature.log'):
+        """ Initializes the error log
+
+            Arguments:
+            filename -- (string) file to which the errors are appended
+        """
+        self.filename = filename
+        self.__queue = Queue()
+        self.__counters = {}
+        self.__lock = Lock()
+        self.__thread = None
+
+    def record(self, source, error):
+        """ counts an error and queues it for the log file, never blocks
+
+            Arguments:
+            source -- (string) origin of the error, e.g. 'slave 1 loop 3'
+            error -- (Exception) the error which occurred
+        """
+        timestamp = time.time()
+
+        with self.__lock:
+            counter = self.__counters.get(source)
+            if counter is None:
+                counter = {'count': 0, 'first': timestamp, 'last': timestamp}
+                self.__counters[source] = counter
+            counter['count'] += 1
+            counter['last'] = timestamp
+
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run,
+                                       name='Mini8ErrorLog')
+                self.__thread.daemon = True
+                self.__thread.start()
+
+        self.__queue.put((timestamp, source, error))
+
+    def get_statistics(self, source=None):
+        """ returns the error statistics of one or of all sources
+
+            Arguments:
+            source -- (string) origin of the errors, None for all sources
+
+            Result:
+            (dict) -- 'count', timestamps of the 'first' and 'last' error and
+                      the 'rate' in errors per second since the first error.
+                      Without a source a dict of these dicts is returned.
+        """
+        if source is None:
+            with self.__lock:
+                sources = list(self.__counters)
+            return dict((name, self.get_statistics(name)) for name in sources)
+
+        now = time.time()
+        with self.__lock:
+            counter = self.__counters.get(source)
+            if counter is None:
+                return {'count': 0, 'first': None, 'last': None, 'rate': 0.0}
+            statistics = dict(counter)
+
+        duration = max(now - statistics['first'], 1.0)
+        statistics['rate'] = statistics['count'] / duration
+        return statistics
+
+    def close(self):
+        """ writes all pending errors and stops the background thread """
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join()
+
+    def __run(self):
+        running = True
+        while running:
+            entries = [self.__queue.get()]
+            # write everything which piled up with a single open
+            while True:
+                try:
+                    entries.append(self.__queue.get_nowait())
+                except Empty:
+                    break
+
+            if None in entries:
+                running = False
+                entries = [entry for entry in entries if entry is not None]
+
+            try:
+                with open(self.filename, 'a') as fh:
+                    for timestamp, source, error in entries:
+                        fh.write('{} {}: Unexpected error: {}: {}\n'.format(
+                            datetime.fromtimestamp(timestamp).isoformat(),
+                            source, type(error).__name__, error))
+            except IOError:
+                pass
+
+
 class Loop(object):
     """ This class enables an easy access to a certain Loop """
+
+    # offset of the first register (process value) inside a loop block, the
+    # number of registers up to the working set point and the offset of the
+    # set point rate. Reading the 70 registers in between would need ~80 ms
+    # on the wire at 19200 baud, two short requests are faster.
+    BLOCK_OFFSET = 1
+    BLOCK_LENGTH = 5
+    RATE_OFFSET = 70
+
     def __init__(self, instrument, baseNumber, lock):
         """ Initializes the Loop class with an EurothermMini8 instrument and the
-            Loop number
+            Loop number. No data is read until a value is requested.
 
         Arguments:
         instrument -- (EurothermMini8) Instrument instance which should be used
-        base_number -- (int) Identifier of Loop, 0 <= base_number <= 7
+        base_number -- (int) Base register of the Loop, e.g. 256 for Loop 1
         """
         self.instrument = instrument
         self.base_number = baseNumber
         self.lock = lock
+        self.name = instrument.get_source('loop {}'.format(baseNumber // 256))
 
         self.tsp = 0
         self.pv = 0
@@ -44,36 +166,54 @@ class Loop(object):
         self.tspr = 0
 
         self.last_time = time.time() - 1
-        self.__get_all()
-
-
 
     def __allowed_to_get_new_data(self):
         return (time.time() - self.last_time > 0.5)
 
     def __get_all(self):
         if not self.__allowed_to_get_new_data():
-            return 
+            return
 
+        self.refresh()
+
+    def refresh(self):
+        """ reads all values of the Loop with two short Modbus requests
+
+            Result:
+            (bool) -- True if the values were updated
+        """
         self.lock.acquire()
         self.last_time = time.time()
 
         try:
-            data = self.instrument.read_registers(self.base_number + 1, 5)
-            tspr = self.instrument.read_register(self.base_number + 70, 1)
-        except:
-            with open('temperature.log', 'a') as fh:
-                fh.write('{} Unexpected error: {}\n'.format(
-                        datetime.now().isoformat(), sys.exc_info()[0]))
-            return
+            data = self.instrument.read_registers(
+                self.base_number + self.BLOCK_OFFSET, self.BLOCK_LENGTH)
+            data.append(self.instrument.read_register(
+                self.base_number + self.RATE_OFFSET))
+        except Exception as error:
+            data = error
         finally:
             self.lock.release()
 
+        if isinstance(data, Exception):
+            self.instrument.error_log.record(self.name, data)
+            return False
+
+        self.update(data)
+        return True
+
+    def update(self, data):
+        """ updates the Loop from raw register values
+
+            Arguments:
+            data -- (list) BLOCK_LENGTH registers starting at
+                    base_number + BLOCK_OFFSET followed by the set point rate
+        """
         self.pv = data[0] / 10.0
         self.tsp = data[1] / 10.0
         self.ao = data[3] / 10.0
         self.wsp = data[4] / 10.0
-        self.tspr = tspr
+        self.tspr = data[self.BLOCK_LENGTH] / 10.0
 
     def get_process_value(self):
         """ returns the current ProcessValue in Degrees C """
@@ -92,18 +232,7 @@ class Loop(object):
             Arguments:
             value -- (float) Temperature
         """
-        self.lock.acquire()
-        try:
-            fh = open('test.dat', 'w')
-            fh.write('sonmething')
-            fh.close()
-            self.instrument.write_register(self.base_number + 2, value, 1)
-        except:
-            return -1
-        finally:
-            self.lock.release()
-        
-        return 1
+        return self.__write(self.base_number + 2, value)
 
     def get_working_set_point(self):
         """ returns the current working set point """
@@ -123,16 +252,36 @@ class Loop(object):
 
 
     def set_set_point_rate(self, value):
+        """ sets the current set point rate
+
+            Arguments:
+            value -- (float) rate
+        """
+        return self.__write(self.base_number + self.RATE_OFFSET, value)
+
+    def get_error_statistics(self):
+        """ returns the communication error statistics of this Loop, see
+            CommunicationErrorLog.get_statistics
+        """
+        return self.instrument.error_log.get_statistics(self.name)
+
+    def __write(self, register, value):
         self.lock.acquire()
         try:
-            self.instrument.write_register(self.base_number + 70,
-                                            value, 
-                                            numberOfDecimals=1,
-                                            signed=False)
-        except:
-            return -1
+            self.instrument.write_register(register,
+                                           value,
+                                           numberOfDecimals=1,
+                                           signed=False)
+        except Exception as error:
+            result = error
+        else:
+            result = None
         finally:
             self.lock.release()
+
+        if result is not None:
+            self.instrument.error_log.record(self.name, result)
+            return -1
         return 1
 
 class EurothermMini8(ModbusInstrument):
@@ -141,21 +290,31 @@ class EurothermMini8(ModbusInstrument):
     # all temperature sensor registers which are available
     __temperature_registers = [4228, 4229, 4230, 4231, 4236, 4237, 4238, 4239]
 
-    def __init__(self, port):
+    def __init__(self, port, prefetch=False, slave_address=1, lock=None,
+                 error_log=None):
         """ inititalizes the ModbusInstrument at a certain COM-Port
 
+            Loops are created on first use by get_loop, so opening the
+            controller does not talk to the device unless prefetch is set.
+
             Arguments:
             port -- path to serial port, e.g. for Windows "COM1"
+            prefetch -- (bool) read all loops at once during initialization
+            slave_address -- (int) Modbus address of the controller
+            lock -- (Lock) lock of the serial line, controllers sharing one
+                    RS-485 line have to share it, see Mini8Bus
+            error_log -- (CommunicationErrorLog) log of the communication
+                         errors, controllers sharing one line share it
         """
-        ModbusInstrument.__init__(self, port, 1)
-        self.lock = Lock()
-        self.
-        self.loops = []
-
-        for i in range(0, 8):
-            self.loops.append(Loop(self, i * 256, self.lock))
-
+        ModbusInstrument.__init__(self, port, slave_address)
+        self.slave_address = slave_address
+        self.lock = lock if lock is not None else Lock()
+        self.error_log = (error_log if error_log is not None
+                          else CommunicationErrorLog())
+        self.loops = [None] * 8
 
+        if prefetch:
+            self.refresh()
 
     def get_temperature(self, sensor_number):
         """ returns the current Temperature of a sensor
@@ -167,23 +326,289 @@ class EurothermMini8(ModbusInstrument):
         if sensor_number < 0 or sensor_number > 7:
             raise Exception('sensorNumber not existent')
 
-        self.lock.acquire()
         register = self.__temperature_registers[sensor_number]
-        value = self.read_register(register,
-                                   numberOfDecimals=2,
-                                   signed=True)
+        self.lock.acquire()
+        try:
+            value = self.read_register(register,
+                                       numberOfDecimals=2,
+                                       signed=True)
+        except Exception as error:
+            self.lock.release()
+            self.error_log.record(
+                self.get_source('temperature {}'.format(sensor_number)), error)
+            raise
         self.lock.release()
-        
+
         return value
 
+    def get_temperatures(self):
+        """ returns the current Temperatures of all sensors with a single
+            Modbus request
+
+            Result:
+            (list) -- eight temperatures, index equals the sensor_number
+        """
+        first = self.__temperature_registers[0]
+        count = self.__temperature_registers[-1] - first + 1
+
+        self.lock.acquire()
+        try:
+            data = self.read_registers(first, count)
+        except Exception as error:
+            self.lock.release()
+            self.error_log.record(self.get_source('temperatures'), error)
+            raise
+        self.lock.release()
+
+        temperatures = []
+        for register in self.__temperature_registers:
+            value = data[register - first]
+            if value >= 0x8000:
+                value -= 0x10000
+            temperatures.append(value / 100.0)
+
+        return temperatures
+
     def get_loop(self, loop_number):
-        """ returns a Loop
+        """ returns a Loop, it is created on the first request
 
             Arguments:
             loop_number -- (int)  0 <= loop_number <= 7
         """
-        
-        return self.loops[loop_number]
+        loop = self.loops[loop_number]
+        if loop is None:
+            loop = Loop(self, loop_number * 256, self.lock)
+            self.loops[loop_number] = loop
+
+        return loop
+
+    def refresh(self):
+        """ reads all Loops, see Loop.refresh """
+        for i in range(0, 8):
+            self.get_loop(i).refresh()
+
+    def get_source(self, name):
+        """ returns the source name of an error log entry of this controller
+
+            Arguments:
+            name -- (string) origin inside the controller, e.g. 'loop 3'
+        """
+        return 'slave {} {}'.format(self.slave_address, name)
+
+    def get_error_statistics(self):
+        """ returns the communication error statistics of all Loops and
+            sensors of this controller, see
+            CommunicationErrorLog.get_statistics
+        """
+        prefix = self.get_source('')
+        return dict((source, statistics) for source, statistics
+                    in self.error_log.get_statistics().items()
+                    if source.startswith(prefix))
+
+LoopSnapshot = namedtuple('LoopSnapshot', ['process_value',
+                                           'target_set_point',
+                                           'working_set_point',
+                                           'active_out',
+                                           'set_point_rate'])
+
+Mini8Snapshot = namedtuple('Mini8Snapshot', ['timestamp',
+                                             'loops',
+                                             'temperatures'])
+
+
+class Mini8Poller(object):
+    """ Polls all Loops and temperatures of an EurothermMini8 at a fixed rate
+        and publishes them as immutable Mini8Snapshot objects. Values which
+        could not be read in a poll are None, a loop which failed is
+        published as None instead of a LoopSnapshot.
+
+        Consumers read the latest snapshot without touching the serial link,
+        so the bus load does not depend on the number of consumers.
+    """
+    def __init__(self, instrument, interval=1.0):
+        """ Initializes the poller, polling starts with start()
+
+            Arguments:
+            instrument -- (EurothermMini8) Instrument which should be polled
+            interval -- (float) seconds between two polls
+        """
+        self.instrument = instrument
+        self.interval = interval
+
+        self.__snapshot = None
+        self.__subscribers = ()
+        self.__subscribers_lock = Lock()
+        self.__stop = Event()
+        self.__thread = None
+
+    @property
+    def snapshot(self):
+        """ returns the latest Mini8Snapshot, None before the first poll """
+        return self.__snapshot
+
+    def subscribe(self, callback):
+        """ registers a callback which receives every new Mini8Snapshot.
+            It is called from the polling thread and should return quickly.
+
+            Arguments:
+            callback -- (callable) called with the snapshot as only argument
+        """
+        with self.__subscribers_lock:
+            self.__subscribers = self.__subscribers + (callback,)
+
+    def unsubscribe(self, callback):
+        """ removes a callback registered with subscribe """
+        with self.__subscribers_lock:
+            self.__subscribers = tuple(subscriber
+                                       for subscriber in self.__subscribers
+                                       if subscriber is not callback)
+
+    def poll(self):
+        """ reads all values with bulk requests, publishes and returns the
+            new Mini8Snapshot
+        """
+        loops = []
+        for i in range(0, 8):
+            loop = self.instrument.get_loop(i)
+            if loop.refresh():
+                loops.append(LoopSnapshot(loop.pv, loop.tsp, loop.wsp, loop.ao,
+                                          loop.tspr))
+            else:
+                # the error is already logged, stale values are not published
+                loops.append(None)
+
+        try:
+            temperatures = tuple(self.instrument.get_temperatures())
+        except Exception:
+            # the error is already logged
+            temperatures = (None,) * 8
+
+        snapshot = Mini8Snapshot(time.time(), tuple(loops), temperatures)
+        # a single reference assignment, readers never see a partial update
+        self.__snapshot = snapshot
+
+        for callback in self.__subscribers:
+            try:
+                callback(snapshot)
+            except Exception as error:
+                self.instrument.error_log.record(
+                    self.instrument.get_source('subscriber'), error)
+
+        return snapshot
+
+    def start(self):
+        """ starts polling in a background thread """
+        if self.__thread is not None:
+            return
+
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__run, name='Mini8Poller')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """ stops the background thread and waits for it """
+        if self.__thread is None:
+            return
+
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def __run(self):
+        next_time = time.time()
+        while not self.__stop.is_set():
+            self.poll()
+            next_time = max(next_time + self.interval, time.time())
+            self.__stop.wait(next_time - time.time())
+
+class Mini8Bus(object):
+    """ Polls several Mini8 controllers daisy-chained on one RS-485 line.
+
+        All controllers share one serial handle, one lock and one
+        CommunicationErrorLog. A single thread polls them round-robin back to
+        back, so the line never idles longer than the Modbus silent period
+        between two controllers. Each controller gets its own Mini8Poller as
+        view for the consumers.
+    """
+    def __init__(self, port, slave_addresses, interval=1.0):
+        """ Initializes the controllers, polling starts with start()
+
+            Arguments:
+            port -- path to serial port, e.g. for Windows "COM1"
+            slave_addresses -- (list) Modbus addresses of the controllers
+            interval -- (float) seconds between two polls of all controllers
+        """
+        self.lock = Lock()
+        self.error_log = CommunicationErrorLog()
+        self.interval = interval
+        self.controllers = OrderedDict()
+        self.__views = OrderedDict()
+
+        serial_port = None
+        for address in slave_addresses:
+            controller = EurothermMini8(port, slave_address=address,
+                                        lock=self.lock,
+                                        error_log=self.error_log)
+            if serial_port is None:
+                serial_port = controller.serial
+            else:
+                controller.serial = serial_port
+
+            self.controllers[address] = controller
+            self.__views[address] = Mini8Poller(controller)
+
+        self.__stop = Event()
+        self.__thread = None
+
+    def get_controller(self, address):
+        """ returns the EurothermMini8 with a certain slave address """
+        return self.controllers[address]
+
+    def get_view(self, address):
+        """ returns the Mini8Poller which publishes the snapshots of the
+            controller with a certain slave address. It is driven by the bus,
+            its start() must not be called.
+        """
+        return self.__views[address]
+
+    def poll(self):
+        """ polls every controller once
+
+            Result:
+            (dict) -- new Mini8Snapshot per slave address
+        """
+        return OrderedDict((address, view.poll())
+                           for address, view in self.__views.items())
+
+    def start(self):
+        """ starts polling in a background thread """
+        if self.__thread is not None:
+            return
+
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__run, name='Mini8Bus')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """ stops the background thread and waits for it """
+        if self.__thread is None:
+            return
+
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def __run(self):
+        next_time = time.time()
+        while not self.__stop.is_set():
+            for view in self.__views.values():
+                if self.__stop.is_set():
+                    return
+                view.poll()
+            next_time = max(next_time + self.interval, time.time())
+            self.__stop.wait(next_time - time.time())
 
 if __name__ == '__main__':
     MINI8 = EurothermMini8('/dev/ttyUSB5')
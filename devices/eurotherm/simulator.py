@@ -0,0 +1,404 @@
+#!/usr/bin/python
+""" This module offers a Modbus RTU slave which simulates a Eurotherm Mini8
+    on a pseudo terminal, so the driver can be used and benchmarked without
+    a physical controller.
+"""
+__author__ = 'Peter Gruszka'
+__version__ = '1.0'
+
+__email__ = 'gruszka@physik.uni-frankfurt.de'
+__status__ = 'alpha'
+__license__ = 'MIT'
+
+import math
+import os
+import select
+import struct
+import time
+import tty
+from threading import Lock, Thread, Event
+
+# Modbus function codes understood by the simulator
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_REGISTERS = 16
+
+# Modbus exception codes
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+
+# start, 8 data and stop bit as used by minimalmodbus (8N1)
+BITS_PER_CHARACTER = 10
+
+
+def crc16(data):
+    """ returns the Modbus CRC of a frame as the two bytes to append
+
+        Arguments:
+        data -- (bytes) frame without checksum
+    """
+    crc = 0xFFFF
+    for byte in bytearray(data):
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return struct.pack('<H', crc)
+
+
+class SimulatedLoop(object):
+    """ A first order model of one Mini8 control loop """
+
+    # registers relative to the base of the loop (n * 256)
+    PROCESS_VALUE = 1
+    TARGET_SET_POINT = 2
+    ACTIVE_OUT = 4
+    WORKING_SET_POINT = 5
+    SET_POINT_RATE = 70
+
+    def __init__(self, temperature=20.0, time_constant=60.0, gain=5.0):
+        """ Initializes the loop at rest
+
+            Arguments:
+            temperature -- (float) initial temperature in degrees C
+            time_constant -- (float) seconds the process value needs to reach
+                             63% of a set point step
+            gain -- (float) output in percent per degree of control error
+        """
+        self.pv = temperature
+        self.tsp = temperature
+        self.wsp = temperature
+        self.ao = 0.0
+        self.tspr = 0.0  # degrees per minute, 0 means no ramp
+
+        self.time_constant = time_constant
+        self.gain = gain
+
+    def step(self, dt):
+        """ advances the model by dt seconds """
+        while dt > 1.0:
+            self.__step(1.0)
+            dt -= 1.0
+        self.__step(dt)
+
+    def __step(self, dt):
+        if self.tspr > 0:
+            delta = self.tspr * dt / 60.0
+            if abs(self.tsp - self.wsp) <= delta:
+                self.wsp = self.tsp
+            elif self.tsp > self.wsp:
+                self.wsp += delta
+            else:
+                self.wsp -= delta
+        else:
+            self.wsp = self.tsp
+
+        decay = math.exp(-dt / self.time_constant)
+        self.pv += (self.wsp - self.pv) * (1 - decay)
+        self.ao = min(max(self.gain * (self.wsp - self.pv), 0.0), 100.0)
+
+    def read(self, offset):
+        """ returns the raw register value at offset """
+        if offset == self.PROCESS_VALUE:
+            value = self.pv
+        elif offset == self.TARGET_SET_POINT:
+            value = self.tsp
+        elif offset == self.ACTIVE_OUT:
+            value = self.ao
+        elif offset == self.WORKING_SET_POINT:
+            value = self.wsp
+        elif offset == self.SET_POINT_RATE:
+            value = self.tspr
+        else:
+            return 0
+        return int(round(value * 10)) & 0xFFFF
+
+    def write(self, offset, raw):
+        """ stores a raw register value written by the master """
+        if offset == self.TARGET_SET_POINT:
+            self.tsp = raw / 10.0
+        elif offset == self.SET_POINT_RATE:
+            self.tspr = raw / 10.0
+
+
+class Mini8Simulator(object):
+    """ Simulates a Eurotherm Mini8 Modbus RTU slave on a pseudo terminal.
+
+        The register map matches the one used by mini8.EurothermMini8: eight
+        loop blocks at n * 256 and the temperature registers 4228 - 4239.
+        Responses are delayed by the turnaround time and the time the frames
+        need on the wire at the given baud rate. Several controllers sharing
+        one RS-485 line are simulated by passing a list of slave addresses.
+    """
+
+    # temperature registers and the loop which is connected to each of them
+    TEMPERATURE_REGISTERS = {4228: 0, 4229: 1, 4230: 2, 4231: 3,
+                             4236: 4, 4237: 5, 4238: 6, 4239: 7}
+
+    def __init__(self, address=1, baudrate=19200, turnaround=0.002,
+                 time_scale=1.0):
+        """ Initializes the simulator, it answers after start()
+
+            Arguments:
+            address -- (int/list) Modbus slave address or addresses
+            baudrate -- (int) simulated baud rate, used for the timing only
+            turnaround -- (float) seconds the device needs to process a request
+            time_scale -- (float) speed up of the loop dynamics
+        """
+        try:
+            self.addresses = tuple(address)
+        except TypeError:
+            self.addresses = (address,)
+        self.baudrate = baudrate
+        self.turnaround = turnaround
+        self.time_scale = time_scale
+
+        self.controllers = dict((slave, [SimulatedLoop() for _ in range(8)])
+                                for slave in self.addresses)
+        # loops of the first controller
+        self.loops = self.controllers[self.addresses[0]]
+        self.frames = 0
+        self.errors = 0
+
+        self.__lock = Lock()
+        self.__last_step = time.time()
+        self.__stop = Event()
+        self.__thread = None
+        self.__master = None
+        self.__slave = None
+        self.port = None
+
+    def start(self):
+        """ opens the pseudo terminal and starts answering requests
+
+            Result:
+            (string) -- path of the serial port to connect to
+        """
+        if self.__thread is not None:
+            return self.port
+
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__master)
+        tty.setraw(self.__slave)
+        self.port = os.ttyname(self.__slave)
+
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__run, name='Mini8Simulator')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+        return self.port
+
+    def stop(self):
+        """ stops answering and closes the pseudo terminal """
+        if self.__thread is None:
+            return
+
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def get_statistics(self):
+        """ returns the number of answered frames and of rejected requests """
+        return {'frames': self.frames, 'errors': self.errors}
+
+    def read_register(self, register, address=None):
+        """ returns the raw value of a register as seen by the master
+
+            Arguments:
+            register -- (int) register number
+            address -- (int) slave address, None for the first controller
+        """
+        loops = self.controllers[address or self.addresses[0]]
+        with self.__lock:
+            self.__step()
+
+            loop_number, offset = divmod(register, 256)
+            if register in self.TEMPERATURE_REGISTERS:
+                loop = loops[self.TEMPERATURE_REGISTERS[register]]
+                return int(round(loop.pv * 100)) & 0xFFFF
+            if 4228 <= register <= 4239:
+                return 0
+            if loop_number < 8:
+                return loops[loop_number].read(offset)
+        raise KeyError(register)
+
+    def write_register(self, register, raw, address=None):
+        """ stores the raw value of a register written by the master
+
+            Arguments:
+            register -- (int) register number
+            raw -- (int) unsigned 16 bit value
+            address -- (int) slave address, None for the first controller
+        """
+        loops = self.controllers[address or self.addresses[0]]
+        with self.__lock:
+            self.__step()
+
+            loop_number, offset = divmod(register, 256)
+            if loop_number >= 8:
+                raise KeyError(register)
+            loops[loop_number].write(offset, raw)
+
+    def __step(self):
+        now = time.time()
+        dt = (now - self.__last_step) * self.time_scale
+        self.__last_step = now
+        for loops in self.controllers.values():
+            for loop in loops:
+                loop.step(dt)
+
+    def __character_time(self, count):
+        return count * BITS_PER_CHARACTER / float(self.baudrate)
+
+    def __run(self):
+        buffer = b''
+        while not self.__stop.is_set():
+            readable, _, _ = select.select([self.__master], [], [], 0.05)
+            if not readable:
+                # 3.5 characters of silence end a frame, drop the rest
+                buffer = b''
+                continue
+
+            try:
+                buffer += os.read(self.__master, 256)
+            except OSError:
+                break
+
+            while True:
+                length = self.__frame_length(buffer)
+                if length is None or len(buffer) < length:
+                    break
+                request, buffer = buffer[:length], buffer[length:]
+                response = self.__handle(request)
+                if response is None:
+                    continue
+
+                time.sleep(self.turnaround
+                           + self.__character_time(len(request))
+                           + self.__character_time(len(response)))
+                os.write(self.__master, response)
+                self.frames += 1
+
+    @staticmethod
+    def __frame_length(buffer):
+        if len(buffer) < 2:
+            return None
+
+        function = bytearray(buffer)[1]
+        if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS,
+                        WRITE_SINGLE_REGISTER):
+            return 8
+        if function == WRITE_MULTIPLE_REGISTERS:
+            if len(buffer) < 7:
+                return None
+            return 9 + bytearray(buffer)[6]
+        # unknown function, the request is exactly what arrived so far
+        return len(buffer)
+
+    def __handle(self, request):
+        if crc16(request[:-2]) != request[-2:]:
+            self.errors += 1
+            return None
+
+        address, function = bytearray(request[:2])
+        if address not in self.controllers:
+            return None
+
+        try:
+            payload = self.__execute(address, function, request[2:-2])
+        except KeyError:
+            self.errors += 1
+            payload = struct.pack('>BB', function | 0x80, ILLEGAL_DATA_ADDRESS)
+        except ValueError:
+            self.errors += 1
+            payload = struct.pack('>BB', function | 0x80, ILLEGAL_FUNCTION)
+
+        frame = struct.pack('>B', address) + payload
+        return frame + crc16(frame)
+
+    def __execute(self, address, function, data):
+        if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            start, count = struct.unpack('>HH', data)
+            values = [self.read_register(start + i, address) for i in range(count)]
+            return struct.pack('>BB', function, 2 * count) + \
+                struct.pack('>{}H'.format(count), *values)
+
+        if function == WRITE_SINGLE_REGISTER:
+            register, value = struct.unpack('>HH', data)
+            self.write_register(register, value, address)
+            return struct.pack('>B', function) + data
+
+        if function == WRITE_MULTIPLE_REGISTERS:
+            start, count = struct.unpack('>HH', data[:4])
+            values = struct.unpack('>{}H'.format(count), data[5:5 + 2 * count])
+            for i, value in enumerate(values):
+                self.write_register(start + i, value, address)
+            return struct.pack('>BHH', function, start, count)
+
+        raise ValueError(function)
+
+
+# benchmark of the driver against the simulator
+if __name__ == '__main__':
+    from mini8 import EurothermMini8, Mini8Poller
+
+    SIMULATOR = Mini8Simulator(time_scale=60.0)
+    PORT = SIMULATOR.start()
+
+    SPOT0 = time.time()
+    MINI8 = EurothermMini8(PORT)
+    SPOT1 = time.time()
+    print('open controller:', SPOT1 - SPOT0)
+
+    N = 20
+    FRAMES = SIMULATOR.frames
+    SPOT0 = time.time()
+    for i in range(N):
+        MINI8.get_temperature(i % 8)
+    SPOT1 = time.time()
+    print('get_temperature: {:.1f} frames/s, {:.1f} values/s'.format(
+        (SIMULATOR.frames - FRAMES) / (SPOT1 - SPOT0), N / (SPOT1 - SPOT0)))
+
+    FRAMES = SIMULATOR.frames
+    SPOT0 = time.time()
+    for i in range(N):
+        MINI8.get_temperatures()
+    SPOT1 = time.time()
+    print('get_temperatures: {:.1f} frames/s, {:.1f} values/s'.format(
+        (SIMULATOR.frames - FRAMES) / (SPOT1 - SPOT0),
+        8 * N / (SPOT1 - SPOT0)))
+
+    FRAMES = SIMULATOR.frames
+    SPOT0 = time.time()
+    for i in range(N):
+        MINI8.refresh()
+    SPOT1 = time.time()
+    print('refresh: {:.1f} frames/s, {:.1f} loops/s'.format(
+        (SIMULATOR.frames - FRAMES) / (SPOT1 - SPOT0),
+        8 * N / (SPOT1 - SPOT0)))
+
+    POLLER = Mini8Poller(MINI8, interval=0.5)
+    POLLER.start()
+    time.sleep(1.0)
+    SPOT0 = time.time()
+    for i in range(100000):
+        POLLER.snapshot.loops[i % 8].process_value
+    SPOT1 = time.time()
+    POLLER.stop()
+    print('snapshot reads: {:.0f} values/s'.format(100000 / (SPOT1 - SPOT0)))
+
+    LOOP = MINI8.get_loop(0)
+    LOOP.set_set_point_rate(60.0)
+    LOOP.set_target_set_point(30.0)
+    time.sleep(2.0)
+    LOOP.refresh()
+    print('loop 0: {} C (TSP: {}, WSP: {}, OUT: {}%)'.format(
+        LOOP.pv, LOOP.tsp, LOOP.wsp, LOOP.ao))
+
+    SIMULATOR.stop()
@@ -7,10 +7,11 @@ import visa
 import gpib
 import time
 import numpy as np
+from LIA_base import LockInAmplifier
 
-class SR830m(object):
+class SR830m(LockInAmplifier):
     def __init__(self, device):
-        self.LIA = device
+        LockInAmplifier.__init__(self, device)
         
         # Defining the extremal values for the device
         self.Vrms_AC_min = 0.004
@@ -23,6 +24,11 @@ class SR830m(object):
         # Possible integration times for the Lock-In amplifier
         self.integration_times = [10E-6, 30E-6, 100E-6, 300E-6, 1E-3, 3E-3, 10E-3, 30E-3, 100E-3, 300E-3, 1, 3, 10, 30, 100, 300, 1E3, 3E3, 10E3, 30E3]
         self.sensitivities = np.array([2E-9, 5E-9, 10E-9, 20E-9, 50E-9, 100E-9, 200E-9, 500E-9, 1E-6, 2E-6, 5E-6, 10E-6, 20E-6, 50E-6, 100E-6, 200E-6, 500E-6, 1E-3, 2E-3, 5E-3, 10E-3, 20E-3, 50E-3, 100E-3, 200E-3, 500E-3, 1])
+        # RC stages of the output filter for the filter slopes 6, 12, 18 and 24 dB/oct (OFSL 0-3)
+        self.filter_stages = [1, 2, 3, 4]
+        # Quantities which can be stored in the buffer (DDEF)
+        self.ch1_displays = {'X': 0, 'R': 1, 'Xnoise': 2, 'aux1': 3, 'aux2': 4}
+        self.ch2_displays = {'Y': 0, 'theta': 1, 'Ynoise': 2, 'aux3': 3, 'aux4': 4}
 
         # self.LIA.write('*RST') # Reset the unit to its default configurations. Careful V = 1V!
         self.LIA.clear()  # Clear the local buffer for GPIB communications
@@ -36,6 +42,13 @@ class SR830m(object):
         self.set_integration_time(1)  # Set (Query) the Time Constant to 1s.
         time.sleep(1)
     
+    def buffer_display(self, channel, display):
+        ''' Method to get the DDEF command which stores the display in the buffer channel 1 or 2, the ratio is always off. '''
+        displays = self.ch1_displays if channel == 1 else self.ch2_displays
+        if display not in displays:
+            raise ValueError("Desired channel display is not allowed.")
+        return 'DDEF ' + str(channel) + ',' + str(displays[display]) + ',0'
+
     def set_voltage(self, value):
         ''' Set (Query) the Sine Output Amplitude to x Vrms. 0.004 <= x <= 5.000V. Use "save" to set the voltage to the minimum value. '''
         
@@ -98,37 +111,6 @@ class SR830m(object):
         # print output_str + " s"
         return output_str
     
-    def auto_adjust_sensitivity(self):
-        ''' Method to use the internal sensitivity adjustment of the LIA. Careful this takes some time and may cause problems. Better use adjust_sensitivity() '''
-        self.LIA.write('AGAN')
-        
-    def adjust_sensitivity(self):
-        ''' Method to automatically adjust the sensitivity of the device to fit the measured value. Returns the new sensitivity set for the system. '''
-        integration_time = self.integration_times[int(self.LIA.ask('OFLT?'))]
-        
-        
-        while True:
-            time.sleep(3 * (integration_time))  # Wait for the system to be in a steady state before adjusting the sensitivity
-            sensitivity = self.LIA.ask('SENS?')
-            values = self.LIA.ask("SNAP? 1,2").split(',')  # Get the values for X and Y to set the sensitivity for the higher of both
-            x = abs(float(values[0]))
-            y = abs(float(values[1]))
-            max_value = max(x, y) * 1.1  # Determine the necessary value for the sensitivity with a 10% margin for variation
-            # Compare the measured value to the list of possible sensitivities and choose the lowest one possible
-            result, = np.where(max_value < self.sensitivities)
-            if len(result) > 0:
-                new_sensitivity = np.min(result)
-            else:
-                new_sensitivity = np.where(self.sensitivities == 1)[0][0]  # If the value is higher than the list the sensitivity is set to 1 V
-
-            # Set the new sensitivity if it differs from the old one
-            if int(sensitivity) != int(new_sensitivity):
-                self.LIA.write('SENS ' + str(new_sensitivity))
-            else:
-                break
-            
-        return self.sensitivities[new_sensitivity]
-    
     def set_sensitivity(self, value):
         '''Set (Query) the Sensitivity to 2 nV through 1 V rms full scale. Use "max" to set the sensitivity to 1 V rms. Other allowed values are:
             [2E-9, 5E-9, 10E-9, 20E-9, 50E-9, 100E-9, 200E-9, 500E-9, 1E-6, 2E-6, 5E-6, 10E-6, 20E-6, 50E-6, 100E-6, 200E-6, 500E-6, 1E-3, 2E-3, 5E-3, 10E-3, 20E-3, 50E-3, 100E-3, 200E-3, 500E-3, 1].'''
@@ -7,10 +7,11 @@ import visa
 import gpib
 import time
 import numpy as np
+from LIA_base import LockInAmplifier
 
-class SR844m(object):
+class SR844m(LockInAmplifier):
     def __init__(self, device):
-        self.LIA = device
+        LockInAmplifier.__init__(self, device)
         
         # Defining the extremal values for the device
         self.V_AUX_output_min = -10.5
@@ -21,6 +22,11 @@ class SR844m(object):
         # Possible integration times for the Lock-In amplifier
         self.integration_times = [100E-6,300E-6,1E-3,3E-3,10E-3,30E-3,100E-3,300E-3,1,3,10,30,100,300,1E3,3E3,10E3,30E3]
         self.sensitivities = np.array([100E-9, 300E-9, 1E-6, 3E-6, 10E-6, 30E-6, 100E-6, 300E-6, 1E-3, 3E-3, 10E-3, 30E-3, 100E-3, 300E-3, 1])
+        # RC stages of the output filter for no filter and the filter slopes 6, 12, 18 and 24 dB/oct (OFSL 0-4)
+        self.filter_stages = [0, 1, 2, 3, 4]
+        # Quantities which can be stored in the buffer (DDEF)
+        self.ch1_displays = {'X': 0, 'R': 1, 'RdBm': 2, 'Xnoise': 3, 'aux1': 4}
+        self.ch2_displays = {'Y': 0, 'theta': 1, 'Ynoise': 2, 'YnoisedBm': 3, 'aux2': 4}
 
         #self.LIA.write('*RST') # Reset the unit to its default configurations. Careful V = 1V!
         self.LIA.clear() # Clear the local buffer for GPIB communications
@@ -33,9 +39,16 @@ class SR844m(object):
         self.LIA.clear()
         time.sleep(1)
         
+    def buffer_display(self, channel, display):
+        ''' Method to get the DDEF command which stores the display in the buffer channel 1 or 2. The SR844 sets no ratio with DDEF. '''
+        displays = self.ch1_displays if channel == 1 else self.ch2_displays
+        if display not in displays:
+            raise ValueError("Desired channel display is not allowed.")
+        return 'DDEF ' + str(channel) + ',' + str(displays[display])
+
     def set_voltage(self, value):
         ''' Not allowed with SR844m. Ref Out is allways set to a 1Vpp square function. If you want another voltage or signal use the HP3325B Function Generator. '''
-        print "Method not implemented! See help."
+        print("Method not implemented! See help.")
         
     def set_frequency(self, value):
         ''' Set (Query) the Reference Frequency to f Hz.Set only in Internal reference mode. 10 kHz  <= x <= 200MHz. '''
@@ -43,71 +56,39 @@ class SR844m(object):
         if self.frequency_min <= value <= self.frequency_max:
             value_verified = True
         else:
-            print "Desired frequency is out of device range."
+            print("Desired frequency is out of device range.")
             value_verified = False
         
         if value_verified:
             signal_str = 'FREQ ' + str(value)
-            #print signal_str
+            #print(signal_str)
             self.LIA.write(signal_str)
             
     def get_frequency(self):
         ''' Method to get the output frequency set for the device '''
         output_str = self.LIA.ask("FREQ?")
-        #print output_str + " Hz"
+        #print(output_str + " Hz")
         return output_str
         
     def set_integration_time(self, value):
         '''Set (Query) the Time Constant to 10 us through 30 ks, allowed values are: [10E-6,30E-6,100E-6,300E-6,1E-3,3E-3,10E-3,30E-3,100E-3,300E-3,1,3,10,30,100,300,1E3,3E3,10E3,30E3] 
         Caution: Time constants greater than 30s may NOT be set if theharmonic x ref. frequency (detection frequency) exceeds 200 Hz. Read manual for further information.'''
         if value in self.integration_times:
-			value_verified = True
+            value_verified = True
         else:
-            print "Desired integration time is not an allowed value for the device."
+            print("Desired integration time is not an allowed value for the device.")
             value_verified = False
         
         if value_verified == True:
-			entry_index = self.integration_times.index(value)
-			self.LIA.write('OFLT ' + str(entry_index))
+            entry_index = self.integration_times.index(value)
+            self.LIA.write('OFLT ' + str(entry_index))
         
     def get_integration_time(self):
         ''' Method to get the integration time set for the device '''
         output_str = str(self.integration_times[int(self.LIA.ask("OFLT?"))])
-        #print output_str + " s"
+        #print(output_str + " s")
         return output_str
     
-    def auto_adjust_sensitivity(self):
-        ''' Method to use the internal sensitivity adjustment of the LIA. Careful this takes some time and may cause problems. Better use adjust_sensitivity() '''
-        self.LIA.write('AGAN')
-        
-    def adjust_sensitivity(self):
-        ''' Method to automatically adjust the sensitivity of the device to fit the measured value. Returns the new sensitivity set for the system. '''
-        integration_time = self.integration_times[int(self.LIA.ask('OFLT?'))]
-        
-        
-        while True:
-            time.sleep(3*(integration_time)) # Wait for the system to be in a steady state before adjusting the sensitivity
-            sensitivity = self.LIA.ask('SENS?')
-            values = self.LIA.ask("SNAP? 1,2").split(',') # Get the values for X and Y to set the sensitivity for the higher of both
-            x = abs(float(values[0]))
-            y = abs(float(values[1]))
-            max_value = max(x, y) * 1.1 # Determine the necessary value for the sensitivity with a 10% margin for variation
-            # Compare the measured value to the list of possible sensitivities and choose the lowest one possible
-            result, = np.where(max_value < self.sensitivities)
-            if len(result) > 0:
-                new_sensitivity = np.min(result)
-            else:
-                new_sensitivity = np.where(self.sensitivities == 1)[0][0] # If the value is higher than the list the sensitivity is set to 1 V
-
-            # Set the new sensitivity if it differs from the old one
-            if int(sensitivity) != int(new_sensitivity):
-                self.LIA.write('SENS ' + str(new_sensitivity))
-            else:
-                break
-                print "here"
-            
-        return self.sensitivities[new_sensitivity]
-    
     def set_sensitivity(self, value):
         '''Set (Query) the Sensitivity to 2 nV through 1 V rms full scale. Use "max" to set the sensitivity to 1 V rms. Other allowed values are:
             [2E-9, 5E-9, 10E-9, 20E-9, 50E-9, 100E-9, 200E-9, 500E-9, 1E-6, 2E-6, 5E-6, 10E-6, 20E-6, 50E-6, 100E-6, 200E-6, 500E-6, 1E-3, 2E-3, 5E-3, 10E-3, 20E-3, 50E-3, 100E-3, 200E-3, 500E-3, 1].'''
@@ -118,7 +99,7 @@ class SR844m(object):
         elif value in self.sensitivities:
             value_verified = True
         else:
-            print "Desired sensitivity is not an allowed value for the device."
+            print("Desired sensitivity is not an allowed value for the device.")
             value_verified = False
         
         if value_verified == True:
@@ -128,14 +109,14 @@ class SR844m(object):
     def get_sensitivity(self):
         ''' Method to get the sensitivity set for the device '''
         output_str = str(self.sensitivities[int(self.LIA.ask("SENS?"))])
-        #print output_str + " Vrms"
+        #print(output_str + " Vrms")
         return output_str
     
     def get_measured_values(self):
         ''' Method to get sevaral output values of the device: X, Y, R, angle, frequency. Returns dictionary with these values.'''
         output_str = self.LIA.ask("SNAP? 1,2,3,5,8")
         output_list = output_str.split(",")
-        print output_list
+        print(output_list)
         output_dict = {}
         output_dict["X"] = float(output_list[0])
         output_dict["Y"] = float(output_list[1])
@@ -148,27 +129,27 @@ class SR844m(object):
     def get_value_X(self):
         ''' Method to get the measured X value. '''
         output_str = float(self.LIA.ask("OUTP? 1"))
-        #print output_str
+        #print(output_str)
         return output_str
         
         
     def get_value_Y(self): 
         ''' Method to get the measured Y value. '''
         output_str = float(self.LIA.ask("OUTP? 2"))
-        #print output_str
+        #print(output_str)
         return output_str 
         
     def get_value_R(self):
         ''' Method to get the measured R value. '''
         output_str = float(self.LIA.ask("OUTP? 3"))
-        #print output_str
+        #print(output_str)
         return output_str
         
     def get_value_angle(self): 
         ''' Method to get the measured angle value. '''
         output_str = float(self.LIA.ask("OUTP? 5"))
-        #print output_str
-        return output_str	
+        #print(output_str)
+        return output_str   
     
     def set_voltage_aux_output(self, value, i):
         ''' Set (Query) voltage of Aux Output i (1,2) to x Volts. -10.500 <= x <= 10.500. '''
@@ -176,39 +157,40 @@ class SR844m(object):
         if self.V_AUX_output_min <= value <= self.V_AUX_output_max:
             value_verified = True
         else:
-            print "Desired voltage is out of device range."
+            print("Desired voltage is out of device range.")
             value_verified = False
         
         if i in [1,2]:
             output_verified = True
         else:
-            print "Desired output is not allowed."
+            print("Desired output is not allowed.")
             output_verified = False
         
         
         if value_verified and output_verified:
             signal_str = 'AUXO ' + str(i) + str(value)
-            #print signal_str
+            #print(signal_str)
             self.LIA.write(signal_str)  
              
     def clean_up(self):
-		'''Resets the Lock-In-Amplifier to a save state by putting the outputs to zero. '''
+        '''Resets the Lock-In-Amplifier to a save state by putting the outputs to zero. '''
                 
-		self.set_voltage_aux_output(0.0)
-		self.set_sensitivity("save")
+        for i in [1, 2]:
+            self.set_voltage_aux_output(0.0, i)
+        self.set_sensitivity("save")
         
     
-		
+        
 # Beispielprogramm
 # Es werden immer das visa und das HP3325B Modul benoetigt
 if __name__ == '__main__':
     device = visa.instrument("GPIB::8", timeout=None) #Lock-In Amp
-    LIA = SR830m(device)
+    LIA = SR844m(device)
     #LIA.set_frequency(120)
     #LIA.set_voltage(10)
     #LIA.adjust_sensitivity()
-    #print LIA.get_voltage()
-    #print LIA.get_frequency()
-    #print LIA.get_integration_time()
+    #print(LIA.get_voltage())
+    #print(LIA.get_frequency())
+    #print(LIA.get_integration_time())
     LIA.clean_up()
     
@@ -0,0 +1,124 @@
+# LIA-Basisklasse
+# Gemeinsame Schnittstelle der Lock-In-Amplifier SR830m und SR844m
+
+import importlib.util
+import os
+import sys
+import time
+import numpy as np
+
+
+def _load_lockin():
+    ''' Loads the settle time model and the data buffer engine shared with the driver in stanfordResearchSystems from its file.
+        The name of this directory is no valid package name, the module is registered under its package name so the drivers share one copy. '''
+    name = 'stanfordResearchSystems.lockin'
+    if name not in sys.modules:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stanfordResearchSystems', 'lockin.py')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+_lockin = _load_lockin()
+BUFFER_SIZE, DataBuffer, settleTime = _lockin.BUFFER_SIZE, _lockin.DataBuffer, _lockin.settleTime
+
+class LockInAmplifier(object):
+    ''' Interface shared by the Stanford Research lock-in amplifiers: autoranging, settle time and the data buffer.
+        Subclasses define integration_times, sensitivities, filter_stages, the channel displays ch1_displays and ch2_displays and buffer_display(). '''
+
+    buffer_size = BUFFER_SIZE
+
+    integration_times = []
+    sensitivities = np.array([])
+    # Number of RC stages of the output filter, index is the OFSL parameter
+    filter_stages = []
+    # Quantities which can be stored in the buffer, values are the DDEF parameter
+    ch1_displays = {}
+    ch2_displays = {}
+
+    def __init__(self, device):
+        self.LIA = device
+        self.buffer = DataBuffer(self.LIA.write, self.LIA.ask, self.read_bytes, self.buffer_display)
+
+    def buffer_display(self, channel, display):
+        ''' Method to get the DDEF command which stores the display (see ch1_displays, ch2_displays) in the buffer channel 1 or 2. '''
+        raise NotImplementedError
+
+    def read_bytes(self, count):
+        ''' Method to read exactly count bytes from the device. '''
+        data = b''
+        while len(data) < count:
+            data += self.LIA.read_raw()
+        return data[:count]
+
+    def auto_adjust_sensitivity(self):
+        ''' Method to use the internal sensitivity adjustment of the LIA. Careful this takes some time and may cause problems. Better use adjust_sensitivity() '''
+        self.LIA.write('AGAN')
+
+    def adjust_sensitivity(self):
+        ''' Method to automatically adjust the sensitivity of the device to fit the measured value. Returns the new sensitivity set for the system. '''
+        return self.autorange()
+
+    def get_settle_time(self, accuracy=0.99):
+        ''' Method to get the time in seconds the output filter needs to settle to the accuracy (default 99%) after a step, computed from the time constant (OFLT) and the filter slope (OFSL). '''
+        integration_time = self.integration_times[int(self.LIA.ask('OFLT?'))]
+        return settleTime(integration_time, self.filter_stages[int(self.LIA.ask('OFSL?'))], accuracy)
+
+    def autorange(self, margin=1.1, max_steps=3):
+        ''' Method to adjust the sensitivity in one or two steps. On an overload (LIAS?) the range is set to the maximum, otherwise the range fitting the measured magnitude with a margin for variation is chosen directly.
+            Every step waits the settle time of the output filter. Returns the new sensitivity set for the system. '''
+        settle_time = self.get_settle_time()
+        sensitivity = int(self.LIA.ask('SENS?'))
+        top = len(self.sensitivities) - 1
+
+        for step in range(max_steps):
+            self.LIA.ask('LIAS?')  # Reading the status clears the overload bits
+            time.sleep(settle_time)  # Wait for the system to be in a steady state before adjusting the sensitivity
+            status = int(self.LIA.ask('LIAS?'))
+
+            if status & 0x07:  # Input, filter or output overload, the measured values are not valid
+                new_sensitivity = top
+            else:
+                values = self.LIA.ask("SNAP? 1,2").split(',')
+                magnitude = np.hypot(float(values[0]), float(values[1])) * margin
+                # The lowest sensitivity above the magnitude, the maximum if the value is higher than the list
+                new_sensitivity = min(int(np.searchsorted(self.sensitivities, magnitude, side='right')), top)
+
+            # Set the new sensitivity if it differs from the old one
+            if new_sensitivity == sensitivity:
+                break
+            self.LIA.write('SENS ' + str(new_sensitivity))
+            sensitivity = new_sensitivity
+
+        return self.sensitivities[sensitivity]
+
+    def configure_buffer(self, rate=512, ch1='X', ch2='Y', loop=False):
+        ''' Method to configure the data buffer and to clear it. The rate is a sample rate in Hz or "trigger" to store one point per trigger, ch1 and ch2 select the stored quantities (see ch1_displays, ch2_displays).
+            With loop the buffer starts again at the beginning when it is full, otherwise storing stops. '''
+        self.buffer.configure(rate, ch1, ch2, loop)
+
+    def start_buffer(self):
+        ''' Method to start or resume storing data. '''
+        self.buffer.start()
+
+    def pause_buffer(self):
+        ''' Method to pause storing data. '''
+        self.buffer.pause()
+
+    def reset_buffer(self):
+        ''' Method to reset the buffer, all stored data is lost. '''
+        self.buffer.reset()
+
+    def get_buffered_points(self):
+        ''' Method to get the number of points stored in the buffer. '''
+        return self.buffer.points
+
+    def read_buffer(self, channel, start=0, count=None):
+        ''' Method to download points of channel 1 or 2 from the buffer in binary form (TRCB). Returns a numpy array. '''
+        return self.buffer.read(channel, start, count)
+
+    def acquire(self, count, rate=512, ch1='X', ch2='Y'):
+        ''' Method to record count points with the internal sample rate. The host only polls the number of stored points while the device samples.
+            Returns numpy arrays of channel 1 and channel 2. '''
+        return self.buffer.acquire(count, rate, ch1, ch2)
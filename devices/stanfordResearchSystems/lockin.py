@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Protocol engine shared by the Stanford Research lock-in drivers (SR830, SR844): settle time and data buffer
+
+from typing import Callable, Tuple, Union
+
+import math
+import time
+
+import numpy as np
+
+# Sample rates of the data buffer in Hz, the index is the SRAT parameter
+SAMPLE_RATES = [62.5E-3, 125E-3, 250E-3, 500E-3, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+# SRAT parameter which stores one point per trigger
+TRIGGER_RATE = 14
+BUFFER_SIZE = 16383
+
+
+def settleTime(timeConstant: float, stages: int, accuracy: float = 0.99, detection: float = None) -> float:
+    """
+    Time the outputs need after a step at the input until they are within the accuracy of the final value.
+
+    The low pass filter is a cascade of RC stages with the time constant OFLT, one stage per 6 dB/oct of the slope.
+    Its step response misses the final value by exp(-t/tau) * sum((t/tau)**k / k!, k < stages), which gives
+    about 4.6, 6.6, 8.4 and 10 time constants for 99%. An active synchronous filter adds one period of the detection
+    frequency.
+
+    :param timeConstant: time constant of one stage in s
+    :param stages: number of RC stages, 0 without a filter
+    :param accuracy: fraction of the final value, e.g. 0.99 or 0.999
+    :param detection: detection frequency in Hz of an active synchronous filter, None without it
+    :return: settle time in s
+    """
+    assert 0 < accuracy < 1, 'Accuracy should be between 0 and 1!'
+    error = 1 - accuracy
+
+    def residual(x: float) -> float:
+        return math.exp(-x) * sum(x ** k / math.factorial(k) for k in range(stages))
+
+    # the residual falls monotonically, bisect between a lower and an upper bound in time constants
+    low, high = 0.0, 1.0
+    while residual(high) > error:
+        low, high = high, 2 * high
+    while high - low > 1E-3:
+        middle = (low + high) / 2
+        if residual(middle) > error:
+            low = middle
+        else:
+            high = middle
+    result = high * timeConstant if stages > 0 else 0.0
+
+    if detection is not None:
+        result += 1 / detection
+    return result
+
+
+class DataBuffer(object):
+    """
+    Data buffer of a lock-in amplifier: configuration, storage control and binary download.
+
+    The driver passes the functions which talk to the instrument, so the engine works with pyvisa resources as well as
+    with the old visa instruments. The channel displays differ between the models, the driver builds the DDEF command.
+    """
+
+    def __init__(self, write: Callable[[str], None], query: Callable[[str], str], readBytes: Callable[[int], bytes],
+                 ddef: Callable[[int, str], str], check: Callable[[], None] = None):
+        """
+        :param write: sends a command
+        :param query: sends a query and returns the reply
+        :param readBytes: reads exactly the given number of bytes
+        :param ddef: returns the DDEF command storing a display (e.g. 'X') in channel 1 or 2
+        :param check: raises if the instrument rejected a command, called after the configuration and each download
+        """
+        self._write = write
+        self._query = query
+        self._readBytes = readBytes
+        self._ddef = ddef
+        self._check = check or (lambda: None)
+
+    def configure(self, rate: Union[float, str] = 512, ch1: str = 'X', ch2: str = 'Y', loop: bool = False,
+                  triggerStart: bool = False):
+        """
+        Configure the data buffer and clear it (SRAT, SEND, TSTR, DDEF, REST).
+
+        :param rate: sample rate in Hz out of SAMPLE_RATES or 'trigger' to store one point per trigger
+        :param ch1: quantity stored in channel 1
+        :param ch2: quantity stored in channel 2
+        :param loop: continue at the start when the buffer is full instead of stopping
+        :param triggerStart: start the scan with a trigger at the rear panel
+        """
+        if rate == 'trigger':
+            rateIndex = TRIGGER_RATE
+        else:
+            assert rate in SAMPLE_RATES, 'Sample rate should be one of {} Hz!'.format(SAMPLE_RATES)
+            rateIndex = SAMPLE_RATES.index(rate)
+
+        self._write('SRAT{:d};SEND{:d};TSTR{:d};{};{};REST'.format(
+            rateIndex, int(loop), int(triggerStart), self._ddef(1, ch1), self._ddef(2, ch2)))
+        self._check()
+
+    def start(self, delayed: bool = False):
+        """
+        Start or resume storing data (STRT), with delayed=True after a delay of 0.5 s (STRD).
+        """
+        self._write('STRD' if delayed else 'STRT')
+
+    def pause(self):
+        """
+        Pause storing data (PAUS).
+        """
+        self._write('PAUS')
+
+    def reset(self):
+        """
+        Reset the buffer, all stored data is lost (REST).
+        """
+        self._write('REST')
+
+    @property
+    def points(self) -> int:
+        return int(self._query('SPTS?'))
+
+    def read(self, channel: int, start: int = 0, count: int = None, binary: str = 'TRCB') -> np.ndarray:
+        """
+        Download stored points of one channel in binary form.
+
+        :param channel: 1 or 2
+        :param start: index of the first point
+        :param count: number of points, default all points stored after start
+        :param binary: 'TRCB' for IEEE floats or 'TRCL' for the compact non-normalized format
+        :return: float array with count values
+        """
+        assert (channel == 1) or (channel == 2), 'Channel should be 1 or 2!'
+        if binary not in ('TRCB', 'TRCL'):
+            raise ValueError('binary should be TRCB or TRCL!')
+        if count is None:
+            count = self.points - start
+        if count <= 0:
+            return np.empty(0)
+
+        self._write('{}?{:d},{:d},{:d}'.format(binary, channel, start, count))
+        data = self._readBytes(4 * count)
+        self._check()
+        if binary == 'TRCB':
+            return np.frombuffer(data, dtype='<f4').astype(np.float64)
+        raw = np.frombuffer(data, dtype=[('mantissa', '<i2'), ('exponent', '<i2')])
+        return np.ldexp(raw['mantissa'].astype(np.float64), raw['exponent'].astype(np.int32) - 124)
+
+    def acquire(self, count: int, rate: float = 512, ch1: str = 'X', ch2: str = 'Y',
+                binary: str = 'TRCB') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Record count points with the internal sample rate and download both channels.
+
+        The host only polls SPTS? while the instrument samples, the data is transferred in two binary downloads.
+
+        :return: channel 1 and channel 2 values
+        """
+        assert 0 < count <= BUFFER_SIZE, 'Count should be between 1 and {}!'.format(BUFFER_SIZE)
+        self.configure(rate, ch1, ch2)
+        self.start()
+
+        stored = 0
+        while stored < count:
+            time.sleep(max((count - stored) / rate, 0.01))
+            stored = self.points
+        self.pause()
+
+        return self.read(1, 0, count, binary), self.read(2, 0, count, binary)
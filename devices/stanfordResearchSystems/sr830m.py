@@ -5,10 +5,87 @@
 __author__ = 'Marc Hanefeld, Alfons Schuck'
 __version__ = 0.1
 
-from typing import Tuple
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterator, Tuple, Union
 
+import threading
+import time
+
+import numpy as np
 import visa
 
+try:
+    from .lockin import DataBuffer, settleTime
+except ImportError:
+    from lockin import DataBuffer, settleTime
+
+# Parameters which can be read with SNAP? and their numbers
+SNAP_PARAMETERS = {'X': 1, 'Y': 2, 'R': 3, 'theta': 4,
+                   'aux1': 5, 'aux2': 6, 'aux3': 7, 'aux4': 8,
+                   'freq': 9, 'ch1': 10, 'ch2': 11}
+_SNAP_NAMES = {number: name for name, number in SNAP_PARAMETERS.items()}
+
+# Settings of the instrument: property name, mnemonic, type, format of the value, allowed range and error message
+_COMMANDS = (
+    ('phaseShift', 'PHAS', float, '.2f', (-360, 729.99), 'Phase shift should be between -360° and +729.99°!'),
+    ('fmod', 'FMOD', int, 'd', (0, 1), 'FMOD should be 0 (external) or 1 (internal)!'),
+    ('freq', 'FREQ', float, '.4f', (0.001, 102000), 'Frequency should be between 0.001 Hz and 102 kHz!'),
+    ('rslp', 'RSLP', int, 'd', (0, 2),
+     'Reference trigger should be 0 (zero crossing), 1 (rising edge) or 2 (falling edge)!'),
+    ('harm', 'HARM', int, 'd', (1, 19999), 'Detection harmonic should be between 1 and 19999!'),
+    ('slvl', 'SLVL', float, '.3f', (0.004, 5), 'Amplitude of sine-output should be between 0.004 V and 5 V'),
+    ('isrc', 'ISRC', int, 'd', (0, 3), 'Input Configuration should be 0 (A), 1 (A-B), 2 (1 MΩ) or 3 (100 MΩ)!'),
+    ('ignd', 'IGND', int, 'd', (0, 1), 'Shield grounding should be 0 (float) or 1 (ground)!'),
+    ('icpl', 'ICPL', int, 'd', (0, 1), 'Input coupling should be 0 (AC) or 1 (DC)!'),
+    ('ilin', 'ILIN', int, 'd', (0, 3),
+     'Input line notch filter should be 0 (no filter), 1 (Line filter), 2 (2x line filter) or 3 (both filters)!'),
+    ('sens', 'SENS', int, 'd', (0, 26), 'Sensitivity should be integer between 0 and 26! Check user manual.'),
+    ('rmod', 'RMOD', int, 'd', (0, 2), 'Reserve Mode should be 0 (High Reserve), 1 (Normal) or 2 (Low Noise)!'),
+    ('oflt', 'OFLT', int, 'd', (0, 19), 'Time Constant should be integer between 0 and 19! Check user manual.'),
+    ('ofsl', 'OFSL', int, 'd', (0, 3), 'Low pass filter slope should be 0 (6dB), 1 (12dB), 2 (18dB) or 3 (24dB)!'),
+    ('sync', 'SYNC', int, 'd', (0, 1), 'Synchronous filter should be 0 (Off) or 1 (filtering below 200Hz)!'),
+)
+
+
+class _Setting(object):
+    """
+    Property of one entry of _COMMANDS. Reads come from the settings cache, writes are sent without waiting for a
+    reply and are checked later with SR830m.checkErrors.
+    """
+
+    def __init__(self, mnemonic: str, parse, spec: str, limits: Tuple[float, float], message: str):
+        self.mnemonic = mnemonic
+        self.parse = parse
+        self.format = '{}{{:{}}}'.format(mnemonic, spec).format
+        self.minimum, self.maximum = limits
+        self.message = message
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._cached(self.mnemonic)
+
+    def __set__(self, instance, value):
+        assert self.minimum <= value <= self.maximum, self.message
+        instance._send(self.format(self.parse(value)))
+        instance._written(self.mnemonic, value)
+
+
+@lru_cache(maxsize=None)
+def _snapType(names: Tuple[str, ...]):
+    return namedtuple('Snap', names)
+
+
+def _snapNumbers(params: Tuple[Union[str, int], ...]) -> Tuple[int, ...]:
+    if not params:
+        params = ('X', 'Y')
+    assert 2 <= len(params) <= 6, 'SNAP? reads between 2 and 6 parameters!'
+    numbers = tuple(p if isinstance(p, int) else SNAP_PARAMETERS[p] for p in params)
+    assert all(n in _SNAP_NAMES for n in numbers), \
+        'Parameters should be one of {}!'.format(', '.join(SNAP_PARAMETERS))
+    return numbers
+
 
 class SR830m(object):
     def __init__(self, GPIBPort: str = 'GPIB0::6::INSTR'):
@@ -31,6 +108,16 @@ class SR830m(object):
                                50E-6, 100E-6, 200E-6, 500E-6, 1E-3, 2E-3, 5E-3, 10E-3, 20E-3, 50E-3, 100E-3, 200E-3,
                                500E-3, 1]
 
+        # Data buffer engine shared with the SR844 driver
+        self._buffer = DataBuffer(self._send, self.inst.query, self.inst.read_bytes, self._ddef, self.checkErrors)
+
+        # Mirror of the configuration, filled with one batched query by refresh()
+        self._settings = {}
+        self._pendingWrites = 0
+        self._lastChange = time.monotonic()
+        self.verifyWrites = False
+        self.refresh()
+
         """
         # self.LIA.write('*RST') # Reset the unit to its default configurations. Careful V = 1V!
         self.LIA.clear()  # Clear the local buffer for GPIB communications
@@ -46,162 +133,140 @@ class SR830m(object):
         
         """
 
-    # TODO copy docstrings from user manual
-
-    @property
-    def phaseShift(self) -> float:
-        return float(self.inst.query('PHAS?'))
-
-    @phaseShift.setter
-    def phaseShift(self, value: float):
-        assert (value >= -360) and (value <= 729.99), 'Phase shift should be between -360° and +729.99°!'
-        self.inst.query('PHAS{:.2f}'.format(value))
-
-    @property
-    def fmod(self) -> int:
-        return int(self.inst.query('FMOD?'))
-
-    @fmod.setter
-    def fmod(self, value: int):
-        assert (value == 0) or (value == 1), 'FMOD should be 0 (external) or 1 (internal)!'
-        self.inst.query('FMOD{:d}'.format(value))
-
-    @property
-    def freq(self) -> float:
-        return float(self.inst.query('FREQ?'))
-
-    @freq.setter
-    def freq(self, value: float):
-        assert (value >= 0.001) and (value <= 10200), 'Frequency should be between 0.001 Hz and 10200 Hz!'
-
-    @property
-    def rslp(self) -> int:
-        return int(self.inst.query('RSLP?'))
-
-    @rslp.setter
-    def rslp(self, value: int):
-        assert (value >= 0) and (
-                value <= 2), 'Reference trigger should be 0 (zero crossing), 1 (rising edge) or 2 (falling edge)!'
-        self.inst.query('RSLP{:d}'.format(value))
+    # Settings cache
 
-    @property
-    def harm(self) -> int:
-        return int(self.inst.query('HARM?'))
-
-    @harm.setter
-    def harm(self, value: int):
-        assert (value >= 1) and (value <= 19999), 'Detection harmonic should be between 1 and 19999!'
-        self.inst.query('HARM{:d}'.format(value))
-
-    @property
-    def slvl(self) -> float:
-        return float(self.inst.query('SLVL?'))
-
-    @slvl.setter
-    def slvl(self, value: float):
-        assert (value >= 0) and (value <= 5), 'Amplitude of sine-output should be between 0 (=0.004) V and 5 V'
-        if value < 0.004:
-            value = 0.004
-        self.inst.query('SLVL{.3f}'.format(value))
-
-    @property
-    def isrc(self) -> int:
-        return int(self.inst.query('ISRC?'))
-
-    @isrc.setter
-    def isrc(self, value: int):
-        assert (value >= 0) and (value <= 3), 'Input Configuration should be 0 (A), 1 (A-B), 2 (1 MΩ) or 3 (100 MΩ)!'
-
-    @property
-    def ignd(self) -> int:
-        return int(self.inst.query('IGND?'))
+    def _queryMany(self, commands) -> list:
+        """
+        Send several queries in one message and return the replies.
+        """
+        self.inst.write(';'.join(commands))
+        replies = self.inst.read().split(';')
+        while len(replies) < len(commands):
+            replies += self.inst.read().split(';')
+        return replies
 
-    @ignd.setter
-    def ignd(self, value: int):
-        assert (value == 0) or (value == 1), 'Shield grounding should be 0 (float) or 1 (ground)!'
-        self.inst.query('IGND{:d}'.format(value))
+    def refresh(self):
+        """
+        Load all settings into the cache with a single batched query.
+        """
+        mnemonics = list(self._settingTypes)
+        replies = self._queryMany(['{}?'.format(mnemonic) for mnemonic in mnemonics])
+        self._settings = {mnemonic: self._settingTypes[mnemonic](reply)
+                          for mnemonic, reply in zip(mnemonics, replies)}
 
-    @property
-    def icpl(self) -> int:
-        return int(self.inst.query('ICPL?'))
+    def checkConsistency(self) -> bool:
+        """
+        Check the standard event status (*ESR?) for rejected commands.
+        If a command or execution error occurred the cache may be wrong and is reloaded.
 
-    @icpl.setter
-    def icpl(self, value: int):
-        assert (value == 0) or (value == 1), 'Input coupling should be 0 (AC) or 1 (DC)!'
+        :return: True if no write was rejected since the last check
+        """
+        esr = int(self.inst.query('*ESR?'))
+        if esr & 0x30:  # execution error or command error
+            self.refresh()
+            return False
+        return True
 
-    @property
-    def ilin(self) -> int:
-        return int(self.inst.query('ILIN?'))
+    def checkErrors(self):
+        """
+        Deferred error check of the writes since the last check with one batched ERRS? and *ESR? query.
+        If a command was rejected the cache is reloaded.
 
-    @ilin.setter
-    def ilin(self, value: int):
-        assert (value >= 0) and (
-                value <= 3), 'Input line notch filter should be 0 (no filter), 1 (Line filter), 2 (2x line filter) or 3 (both filters)!'
-        self.inst.query('ILIN{:d}'.format(value))
+        :raises RuntimeError: if the instrument reports an error
+        """
+        if not self._pendingWrites:
+            return
+        self._pendingWrites = 0
+        errs, esr = (int(reply) for reply in self._queryMany(['ERRS?', '*ESR?']))
+        if esr & 0x30:  # execution error or command error
+            self.refresh()
+        if errs or esr & 0x30:
+            raise RuntimeError('SR830 reported an error (ERRS {:d}, *ESR {:d})'.format(errs, esr))
+
+    def _send(self, command: str):
+        self.inst.write(command)
+        self._pendingWrites += 1
+
+    def _cached(self, mnemonic: str):
+        if mnemonic == 'FREQ' and self._cached('FMOD') == 0:
+            # with the external reference the frequency is measured and not a setting
+            return float(self.inst.query('FREQ?'))
+        if mnemonic not in self._settings:
+            self._settings[mnemonic] = self._settingTypes[mnemonic](self.inst.query('{}?'.format(mnemonic)))
+        return self._settings[mnemonic]
+
+    def _written(self, mnemonic: str, value):
+        self._settings[mnemonic] = self._settingTypes[mnemonic](value)
+        self._lastChange = time.monotonic()
+        if self.verifyWrites:
+            self.checkConsistency()
 
-    @property
-    def sens(self) -> int:
-        return self.inst.query('SENS?')
+    # TODO copy docstrings from user manual
+    # The settings phaseShift, fmod, freq, ... are generated from _COMMANDS below the class
 
-    @sens.setter
-    def sens(self, value: int):
-        assert (value >= 0) and (value <= 26), 'Sensitivity should be integer between 0 and 26! Check user manual.'
-        self.inst.query('SENS{:d}'.format(value))
+    def settleTime(self, accuracy: float = 0.99, frequency: float = None) -> float:
+        """
+        Time the outputs need after a step at the input until they are within the accuracy of the final value.
 
-    @property
-    def rmod(self) -> int:
-        return int(self.inst.query('RMOD?'))
+        The low pass filter with slope OFSL is a cascade of ofsl + 1 RC stages with the time constant OFLT, an active
+        synchronous filter (SYNC, below 200 Hz) adds one period of the detection frequency, see lockin.settleTime.
 
-    @rmod.setter
-    def rmod(self, value: int):
-        assert (value >= 0) and (value <= 2), ' Reserve Mode should be 0 (High Reserve), 1 (Normal) or 2 (Low Noise)!'
-        self.inst.query('RMOD{:d}'.format(value))
+        :param accuracy: fraction of the final value, e.g. 0.99 or 0.999
+        :param frequency: reference frequency in Hz, default the frequency of the instrument
+        :return: settle time in s
+        """
+        detection = None
+        if self.sync == 1:
+            detection = self.harm * (self.freq if frequency is None else frequency)
+            if detection >= 200:
+                detection = None
+        return settleTime(self._integrationTimes[self.oflt], self.ofsl + 1, accuracy, detection)
+
+    def waitSettled(self, accuracy: float = 0.99, since: float = None, frequency: float = None):
+        """
+        Sleep until the outputs are settled, see settleTime.
 
-    @property
-    def oflt(self) -> int:
-        return int(self.inst.query('OFLT?'))
+        :param since: time.monotonic() of the disturbance, e.g. a change of the source, default the last setting change
+        :param frequency: reference frequency in Hz, see settleTime
+        """
+        if since is None:
+            since = self._lastChange
+        remaining = self.settleTime(accuracy, frequency) - (time.monotonic() - since)
+        if remaining > 0:
+            time.sleep(remaining)
 
-    @oflt.setter
-    def oflt(self, value: int):
-        assert (value >= 0) and (value <= 19), 'Time Constant should be integer between 0 and 19! Check user manual.'
-        self.inst.query('OFLT{:d}'.format(value))
+    # TODO FPOP
+    # TODO OEXP
+    # TODO AOFF
 
     @property
-    def ofsl(self) -> int:
-        return int(self.inst.query('OFSL?'))
-
-    @ofsl.setter
-    def ofsl(self, value: int):
-        assert (value >= 0) and (value <= 3), 'Low pass filter slope should be 0 (6dB), 1 (12dB), 2 (18dB) or 3 (24dB)!'
-        self.inst.query('OFSL{:d}'.format(value))
+    def auxInputs(self) -> np.ndarray:
+        """
+        Voltages of the four aux inputs, read at one instant with SNAP? 5,6,7,8.
+        """
+        return np.array(self.inst.query('SNAP?5,6,7,8').split(','), dtype=np.float64)
 
     @property
-    def sync(self) -> int:
-        return int(self.inst.query('SYNC?'))
-
-    @sync.setter
-    def sync(self, value: int):
-        assert (value == 0) or (value == 1), 'Synchronous filter should be 0 (Off) or 1 (filtering below 200Hz)!'
-        self.inst.query('SYNC{:d}'.format(value))
+    def auxOutputs(self) -> np.ndarray:
+        """
+        Voltages of the four aux outputs, read with one batched query.
+        """
+        return np.array(self._queryMany(['AUXV?{:d}'.format(channel) for channel in range(1, 5)]), dtype=np.float64)
 
-    # TODO DDEF
-    # TODO FPOP
-    # TODO OEXP
-    # TODO AOFF
+    @auxOutputs.setter
+    def auxOutputs(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        assert values.shape == (4,), 'Four output voltages are needed!'
+        assert np.all(np.abs(values) <= self._vAuxOutpMax), 'Output Voltage should be between -10.5V and 10.5V'
+        self._send(';'.join('AUXV{:d},{:.3f}'.format(channel, value) for channel, value in zip(range(1, 5), values)))
 
     @property
     def oaux(self) -> dict:
-        return {1: self.inst.query('OAUX?1'),
-                2: self.inst.query('OAUX?2'),
-                3: self.inst.query('OAUX?3'),
-                4: self.inst.query('OAUX?4')}
+        return dict(zip(range(1, 5), self.auxInputs))
 
     @property
     def auxv(self) -> dict:
-        return {1: self.inst.query('AUXV?1'),
-                2: self.inst.query('AUXV?2'),
-                3: self.inst.query('AUXV?3'),
-                4: self.inst.query('AUXV?4')}
+        return dict(zip(range(1, 5), self.auxOutputs))
 
     @auxv.setter
     def auxv(self, value: Tuple[int, float]):
@@ -209,7 +274,7 @@ class SR830m(object):
         auxVoltage = value[1]
         assert (auxChannel >= 1) and (auxChannel <= 4), 'Output Channel should be 1, 2, 3 or 4!'
         assert (abs(auxVoltage) <= 10.5), 'Output Voltage should be between -10.5V and 10.5V'
-        self.inst.query('AUXV{:d},{:.3f}'.format(auxChannel, auxVoltage))
+        self._send('AUXV{:d},{:.3f}'.format(auxChannel, auxVoltage))
 
     # TODO OUTX
     # TODO OVRM
@@ -219,18 +284,76 @@ class SR830m(object):
     # TODO RSET
 
     def agan(self):
-        self.inst.query('AGAN')
+        self._send('AGAN')
+        self._settings.pop('SENS', None)
 
     def arsv(self):
-        self.inst.query('ARSV')
+        self._send('ARSV')
+        self._settings.pop('RMOD', None)
 
     def aphs(self):
-        self.inst.query('APHS')
+        self._send('APHS')
+        self._settings.pop('PHAS', None)
 
     def aoff(self, value: int):
-        self.inst.query('AOFF {:d}'.format(value))
+        self._send('AOFF {:d}'.format(value))
+
+    # Data storage commands
+    # The buffer stores the channel 1 and channel 2 display values
+    _ch1Displays = {'X': 0, 'R': 1, 'Xnoise': 2, 'aux1': 3, 'aux2': 4}
+    _ch2Displays = {'Y': 0, 'theta': 1, 'Ynoise': 2, 'aux3': 3, 'aux4': 4}
+
+    def _ddef(self, channel: int, display: str) -> str:
+        displays = self._ch1Displays if channel == 1 else self._ch2Displays
+        assert display in displays, 'Channel {} should be one of {}!'.format(channel, ', '.join(displays))
+        return 'DDEF{:d},{:d},0'.format(channel, displays[display])
+
+    def configureBuffer(self, rate: Union[float, str] = 512, ch1: str = 'X', ch2: str = 'Y', loop: bool = False,
+                        triggerStart: bool = False):
+        """
+        Configure the data buffer and clear it, see lockin.DataBuffer.configure.
+
+        :param ch1: quantity stored in channel 1: X, R, Xnoise, aux1 or aux2
+        :param ch2: quantity stored in channel 2: Y, theta, Ynoise, aux3 or aux4
+        """
+        self._buffer.configure(rate, ch1, ch2, loop, triggerStart)
+
+    def startBuffer(self, delayed: bool = False):
+        """
+        Start or resume storing data (STRT), with delayed=True after a delay of 0.5 s (STRD).
+        """
+        self._buffer.start(delayed)
 
-    # TODO Datastorage Commands
+    def pauseBuffer(self):
+        """
+        Pause storing data (PAUS).
+        """
+        self._buffer.pause()
+
+    def resetBuffer(self):
+        """
+        Reset the buffer, all stored data is lost (REST).
+        """
+        self._buffer.reset()
+
+    @property
+    def bufferedPoints(self) -> int:
+        return self._buffer.points
+
+    def readBuffer(self, channel: int, start: int = 0, count: int = None, binary: str = 'TRCB') -> np.ndarray:
+        """
+        Download stored points of one channel in binary form, see lockin.DataBuffer.read.
+        """
+        return self._buffer.read(channel, start, count, binary)
+
+    def acquire(self, count: int, rate: float = 512, ch1: str = 'X', ch2: str = 'Y',
+                binary: str = 'TRCB') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Record count points with the internal sample rate and download both channels, see lockin.DataBuffer.acquire.
+
+        :return: channel 1 and channel 2 values
+        """
+        return self._buffer.acquire(count, rate, ch1, ch2, binary)
 
     @property
     def outpX(self) -> float:
@@ -248,13 +371,70 @@ class SR830m(object):
     def outpT(self) -> float:
         return float(self.inst.query('OUTP?4'))
 
-    # TODO SNAP
-    # TODO SPTS
-    # TODO TRCA
-    # TODO TRCB
-    # TODO TRCL
-    # TODO FAST
-    # TODO STRD
+    def snap(self, *params: Union[str, int]):
+        """
+        Read up to six parameters at the same instant with a single SNAP? query.
+
+        :param params: names from SNAP_PARAMETERS ('X', 'Y', 'R', 'theta', 'aux1'..'aux4', 'freq', 'ch1', 'ch2')
+            or their numbers, default X and Y
+        :return: named tuple with one float per parameter, e.g. snap('X', 'Y').X
+
+        Rejected writes before the read are not checked here, call checkErrors.
+        """
+        numbers = _snapNumbers(params)
+        reply = self.inst.query('SNAP?{}'.format(','.join(str(n) for n in numbers)))
+        return _snapType(tuple(_SNAP_NAMES[n] for n in numbers))(*map(float, reply.split(',')))
+
+    def snaps(self, count: int, *params: Union[str, int]) -> np.ndarray:
+        """
+        Read count snapshots back to back, see snap.
+
+        :return: structured array with one float field per parameter
+        """
+        numbers = _snapNumbers(params)
+        command = 'SNAP?{}'.format(','.join(str(n) for n in numbers))
+        replies = [self.inst.query(command) for _ in range(count)]
+        return self.parseSnaps(replies, *numbers)
+
+    def frequencySweep(self, frequencies, params: Tuple[Union[str, int], ...] = ('X', 'Y'), accuracy: float = 0.99,
+                       results: np.ndarray = None, source=None, lockTimeout: float = 10.0) -> 'FrequencySweep':
+        """
+        Create a frequency sweep, see FrequencySweep. It runs with FrequencySweep.run().
+        """
+        return FrequencySweep(self, frequencies, params, accuracy, results, source, lockTimeout)
+
+    @staticmethod
+    def parseSnaps(replies, *params: Union[str, int]) -> np.ndarray:
+        """
+        Parse many SNAP? replies at once.
+
+        :param replies: iterable of reply strings
+        :param params: parameters of the SNAP? query, see snap
+        :return: structured array with one float field per parameter
+        """
+        numbers = _snapNumbers(params)
+        dtype = np.dtype([(_SNAP_NAMES[n], np.float64) for n in numbers])
+        values = np.array(','.join(replies).split(','), dtype=np.float64)
+        return values.reshape(-1, len(numbers)).view(dtype)[:, 0]
+
+    def fastStream(self, rate: float = 512, chunkSize: int = 64, capacity: int = 1 << 16) -> 'FastStream':
+        """
+        Create a FAST mode stream of X and Y, see FastStream. It starts with FastStream.start().
+        """
+        return FastStream(self, rate, chunkSize, capacity)
+
+    def stream(self, rate: float = 512, chunkSize: int = 64, capacity: int = 1 << 16) -> Iterator[np.ndarray]:
+        """
+        Stream X and Y in real time with FAST mode until the generator is closed.
+
+        :return: generator of float arrays with shape (n, 2) holding X and Y in V
+        """
+        fastStream = self.fastStream(rate, chunkSize, capacity)
+        fastStream.start()
+        try:
+            yield from fastStream.chunks()
+        finally:
+            fastStream.stop()
 
     @property
     def idn(self) -> str:
@@ -264,20 +444,270 @@ class SR830m(object):
         """
         Reset Lock-In
         """
-        self.inst.query('*RST')
+        self._send('*RST')
+        self._settings = {}
 
     # TODO LOCL
-    # TODO TRIG
+
+    def trig(self):
+        """
+        Software trigger, stores one point when the sample rate is 'trigger' (TRIG).
+        """
+        self._send('TRIG')
+
     # TODO CLS
     # TODO ESE
-    # TODO ESR
     # TODO SRE
     # TODO STB
     # TODO PSC
     # TODO ERRE
-    # TODO ERRS
     # TODO LIAE
-    # TODO LIAS
+
+
+for _command in _COMMANDS:
+    setattr(SR830m, _command[0], _Setting(*_command[1:]))
+SR830m._settingTypes = {mnemonic: parse for _, mnemonic, parse, _, _, _ in _COMMANDS}
+
+
+class FastStream(object):
+    """
+    Real time transfer of X and Y from the SR830 with FAST mode.
+
+    While storage runs the instrument sends every sample as a pair of 16 bit integers, where 30000 is full scale.
+    A dedicated thread reads them into a preallocated ring buffer, consumers take scaled chunks with chunks().
+    When consumers fall behind by more than the capacity the oldest samples are dropped and counted in overruns.
+    A bus error in the reader thread ends the stream and is raised by chunks().
+    """
+
+    # longest time in s one read of the reader thread may block, it bounds the wait of stop()
+    READ_PERIOD = 0.1
+
+    def __init__(self, lockin: SR830m, rate: float = 512, chunkSize: int = 64, capacity: int = 1 << 16):
+        """
+        :param lockin: instrument to read from
+        :param rate: sample rate in Hz, see SR830m.configureBuffer
+        :param chunkSize: maximum samples per read from the bus, slow rates read fewer (see READ_PERIOD)
+        :param capacity: samples held in the ring buffer
+        """
+        self._lockin = lockin
+        self._rate = rate
+        self._chunkSize = max(1, min(chunkSize, int(rate * self.READ_PERIOD)))
+        self._ring = np.empty((capacity, 2), dtype=np.int16)
+        self._written = 0
+        self._read = 0
+        self._scale = 1.0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._error = None
+        self._timeout = None
+        self.overruns = 0
+
+    def start(self):
+        """
+        Configure the buffer, enable FAST mode and start the reader thread.
+        """
+        if self._thread is not None:
+            return
+        lockin = self._lockin
+        self._scale = lockin._sensitivities[int(lockin.sens)] / 30000
+        lockin.configureBuffer(self._rate, 'X', 'Y')
+        lockin.inst.write('FAST2;STRD')
+
+        # a read waits for chunkSize samples, the I/O timeout has to be longer
+        self._timeout = lockin.inst.timeout
+        lockin.inst.timeout = 1000 * (2 * self._chunkSize / self._rate + 1)
+        self._error = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='SR830FastStream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the reader thread, leave FAST mode and pause storage.
+        """
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+
+        # the instrument is still talking, a device clear ends the transfer
+        self._lockin.inst.timeout = self._timeout
+        self._lockin.inst.clear()
+        self._lockin.inst.write('FAST0;PAUS')
+
+    def chunks(self, timeout: float = None) -> Iterator[np.ndarray]:
+        """
+        Yield all new samples as float arrays with shape (n, 2) holding X and Y in V until the stream is stopped.
+
+        :param timeout: stop yielding when no sample arrives within timeout seconds
+        """
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._written > self._read or not self._running, timeout):
+                    return
+                if self._written == self._read:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                chunk = self._copy(self._read, self._written)
+                self._read = self._written
+            yield chunk * self._scale
+
+    def _copy(self, first: int, last: int) -> np.ndarray:
+        capacity = len(self._ring)
+        start = first % capacity
+        end = start + last - first
+        if end <= capacity:
+            return self._ring[start:end].astype(np.float64)
+        return np.concatenate((self._ring[start:], self._ring[:end - capacity])).astype(np.float64)
+
+    def _run(self):
+        try:
+            self._receive()
+        except Exception as error:
+            # end the stream, the consumers get the error from chunks()
+            with self._condition:
+                self._error = error
+                self._running = False
+                self._condition.notify_all()
+
+    def _receive(self):
+        inst = self._lockin.inst
+        capacity = len(self._ring)
+        while self._running:
+            samples = np.frombuffer(inst.read_bytes(4 * self._chunkSize), dtype='<i2').reshape(-1, 2)
+            count = len(samples)
+            with self._condition:
+                start = self._written % capacity
+                end = start + count
+                if end <= capacity:
+                    self._ring[start:end] = samples
+                else:
+                    self._ring[start:] = samples[:capacity - start]
+                    self._ring[:end - capacity] = samples[capacity - start:]
+                self._written += count
+
+                if self._written - self._read > capacity:
+                    self.overruns += self._written - self._read - capacity
+                    self._read = self._written - capacity
+                self._condition.notify_all()
+
+
+class FrequencySweep(object):
+    """
+    Frequency sweep of the internal reference or of an external source with pipelined set, settle and read.
+
+    Every point waits exactly the settle time of the current filter settings (see SR830m.settleTime) and is read with
+    one SNAP?. The next FREQ is written right after that read, so the instrument settles while the host stores the
+    result. With a source, e.g. the HP3325B FunctionGenerator driving the reference input, the frequency of the
+    source is stepped instead and the settle time uses the set frequency, so no FREQ? is needed. Every step of the
+    source unlocks the reference, the settle time starts when LIAS? reports the reference locked again and the lock is
+    verified before the SNAP?.
+
+    If run() is interrupted it continues with the first missing point on the next call, a partial result array from an
+    earlier session can be passed in to resume it as well.
+    """
+
+    # seconds between two LIAS? polls while the reference locks
+    LOCK_POLL = 0.01
+
+    def __init__(self, lockin: SR830m, frequencies, params: Tuple[Union[str, int], ...] = ('X', 'Y'),
+                 accuracy: float = 0.99, results: np.ndarray = None, source=None, lockTimeout: float = 10.0):
+        """
+        :param lockin: instrument to sweep
+        :param frequencies: reference frequencies in Hz
+        :param params: parameters read at every point, see SR830m.snap
+        :param accuracy: settling accuracy, see SR830m.settleTime
+        :param results: results of an interrupted sweep with the same frequencies and params
+        :param source: generator with a frequency property in Hz which drives the external reference
+        :param lockTimeout: seconds the reference may need to lock to the source
+        """
+        assert source is None or lockin.fmod == 0, 'The reference should be external (FMOD 0) to sweep a source!'
+        self._lockin = lockin
+        self._source = source
+        self._lockTimeout = lockTimeout
+        self._numbers = _snapNumbers(params)
+        self._accuracy = accuracy
+
+        dtype = [('frequency', np.float64), ('time', np.float64)]
+        dtype += [(_SNAP_NAMES[number], np.float64) for number in self._numbers]
+        if results is None:
+            self.results = np.full(len(frequencies), np.nan, dtype=dtype)
+            self.results['frequency'] = frequencies
+        else:
+            assert results.dtype == np.dtype(dtype), 'Results should have the fields {}!'.format(dtype)
+            assert np.array_equal(results['frequency'], frequencies), 'Results should have the same frequencies!'
+            self.results = results.copy()
+        # points are measured in order, the first missing timestamp marks the resume point
+        self.completed = int(np.count_nonzero(~np.isnan(self.results['time'])))
+
+    def run(self) -> np.ndarray:
+        """
+        Measure all missing points.
+
+        :return: structured array with frequency, time (epoch seconds) and one field per parameter
+        """
+        lockin = self._lockin
+        frequencies = self.results['frequency']
+        count = len(frequencies)
+        if self.completed >= count:
+            return self.results
+
+        self._setFrequency(frequencies[self.completed])
+        changed = time.monotonic()
+        for i in range(self.completed, count):
+            if self._source is None:
+                lockin.waitSettled(self._accuracy, since=changed, frequency=frequencies[i])
+            else:
+                self._waitLocked(changed, frequencies[i])
+            values = lockin.snap(*self._numbers)
+            timestamp = time.time()
+            if i + 1 < count:
+                self._setFrequency(frequencies[i + 1])
+                changed = time.monotonic()
+
+            point = self.results[i]
+            point['time'] = timestamp
+            for name, value in zip(values._fields, values):
+                point[name] = value
+            self.completed = i + 1
+
+        lockin.checkErrors()
+        return self.results
+
+    def _unlocked(self) -> bool:
+        # the unlock bit of LIAS? is latched, reading clears it
+        return bool(int(self._lockin.inst.query('LIAS?')) & 0x08)
+
+    def _waitLocked(self, changed: float, frequency: float):
+        """
+        Wait until the reference is locked to the source and the outputs are settled since then.
+
+        :raises RuntimeError: if the reference does not lock within the lock timeout
+        """
+        lockin = self._lockin
+        deadline = changed + self._lockTimeout
+        while True:
+            # the first read clears the unlock of the step, a clean read means locked since the previous one
+            locked = time.monotonic()
+            while self._unlocked():
+                if time.monotonic() > deadline:
+                    raise RuntimeError('The reference did not lock to the source at {} Hz!'.format(frequency))
+                time.sleep(self.LOCK_POLL)
+                locked = time.monotonic()
+            lockin.waitSettled(self._accuracy, since=max(changed, locked), frequency=frequency)
+            if not self._unlocked():
+                return
+
+    def _setFrequency(self, frequency: float):
+        if self._source is None:
+            self._lockin.freq = frequency
+        else:
+            self._source.frequency = frequency
 
 
 if __name__ == '__main__':